@@ -0,0 +1,213 @@
+import sys, os, subprocess, json, shutil, platform
+import time
+from datetime import datetime, timezone
+from os.path import exists
+from ffmpegcamera import reencode
+from ffmpegcamera.core import Item, ffprobeexec, replacesuffix, getargs
+
+# STATIC **********************************************************************
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FFMPEG = 'ffmpeg'
+FIXTURE_RATE = 30
+FIXTURES = [
+    { 'name':'testsrc-720p-h264',  'size':'1280x720',  'duration':5,  'codec':'libx264', 'ext':'mp4' },
+    { 'name':'testsrc-1080p-h264', 'size':'1920x1080', 'duration':10, 'codec':'libx264', 'ext':'mp4' },
+    { 'name':'testsrc-2160p-h264', 'size':'3840x2160', 'duration':3,  'codec':'libx264', 'ext':'mp4' },
+    { 'name':'testsrc-720p-mpeg4', 'size':'1280x720',  'duration':5,  'codec':'mpeg4',   'ext':'avi' }]
+STAGES = ['probe', 'thumb', 'video', 'audio', 'mux', 'direct']
+MODES = ['temp', 'direct']
+WORKDIR = 'benchmark'
+
+# PRIVATE *********************************************************************
+
+def process(workdir, output, jobs):
+    print("Start")
+    logconfig(workdir, output, jobs)
+
+    print("Step 1 : Fixtures")
+    fixturesdir = os.path.join(workdir, 'fixtures')
+    os.makedirs(fixturesdir, exist_ok=True)
+    for fixture in FIXTURES:
+        fixture['path'] = createfixture(fixture, fixturesdir)
+
+    print("Step 2 : Stages")
+    results = []
+    for fixture in FIXTURES:
+        rundir = resetdir(os.path.join(workdir, 'stages', fixture['name']))
+        input = shutil.copy(fixture['path'], rundir)
+        for stage in STAGES:
+            print(f"{fixture['name']}: {stage}")
+            result = measure(rundir, runstage, stage, input)
+            results.append(report(result, fixture['name'], stage, [fixture]))
+
+    print("Step 3 : Pipeline")
+    for mode in MODES:
+        rundir = resetdir(os.path.join(workdir, 'pipeline', mode))
+        for fixture in FIXTURES:
+            shutil.copy(fixture['path'], rundir)
+        print(f"process: {mode}")
+        result = measure(rundir, runprocess, rundir, mode, jobs)
+        results.append(report(result, 'all', f"process-{mode}", FIXTURES))
+
+    print('End')
+    data = { 'env': getenv(jobs), 'results': results }
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
+    logresults(results)
+    print(f"Saved to {output}")
+
+# FUNCTIONS *********************************************************************
+
+def createfixture(fixture, dirpath):
+    filepath = os.path.join(dirpath, f"{fixture['name']}.{fixture['ext']}")
+    if exists(filepath):
+        return filepath
+    duration = fixture['duration']
+    video = ['-f', 'lavfi', '-i', f"testsrc=size={fixture['size']}:rate={FIXTURE_RATE}:duration={duration}"]
+    audio = ['-f', 'lavfi', '-i', f"sine=frequency=1000:sample_rate=48000:duration={duration}"]
+    codecs = ['-c:v', fixture['codec'], '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest']
+    cmd = [FFMPEG, '-y', '-hide_banner', '-loglevel', 'error', *video, *audio, *codecs, filepath]
+    subprocess.check_output(cmd)
+    print(f"Fixture {filepath} created")
+    return filepath
+
+def resetdir(dirpath):
+    if exists(dirpath):
+        shutil.rmtree(dirpath)
+    os.makedirs(dirpath)
+    return dirpath
+
+def runstage(stage, input):
+    item = Item()
+    item.input = input
+    item.output = input
+    reencode.setoutputcodec(item, reencode.OUTPUT_SUFFIX)
+    reencode.createtemp(item)
+    threads = reencode.getthreadsperjob(os.cpu_count() or 1, 1, 0)
+    if stage == 'probe':
+        ffprobeexec(item.input)
+    elif stage == 'thumb':
+        reencode.savethumb(item)
+    elif stage == 'video':
+        reencode.savevideo(item, threads)
+    elif stage == 'audio':
+        reencode.saveaudio(item)
+    elif stage == 'mux':
+        # intermediates written by the previous stages
+        item.thumb = os.path.join(item.temp, "thumb.jpg")
+        item.video = os.path.join(item.temp, "video.h265")
+        item.audio = os.path.join(item.temp, "audio.m4a")
+        reencode.reencode(item)
+    elif stage == 'direct':
+        item.thumb = os.path.join(item.temp, "thumb.jpg")
+        item.output = replacesuffix(item.input, f"-direct{reencode.OUTPUT_SUFFIX}")
+        reencode.savedirect(item, threads)
+
+# bytes written by the items, intermediates included (temp folders are removed once muxed)
+def runprocess(dirpath, mode, jobs):
+    items = reencode.process(dirpath, jobs=jobs, mode=mode, dedup='off')
+    return sum(item.written for item in items)
+
+# run in a forked child: wait4() gives the peak RSS of the child and its ffmpeg/MP4Box processes
+# bytes written: returned by the function, else growth of the folder
+def measure(rundir, function, *args):
+    before = dirbytes(rundir)
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        result = { 'ok': True }
+        start = time.perf_counter()
+        try:
+            result['written'] = function(*args)
+        except Exception as error:
+            result = { 'ok': False, 'error': str(error) }
+        result['wall'] = time.perf_counter() - start
+        with os.fdopen(write, 'w') as file:
+            json.dump(result, file)
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read, 'r') as file:
+        data = file.read()
+    _, status, usage = os.wait4(pid, 0)
+    result = json.loads(data) if data else { 'ok': False, 'error': f"exit status {status}", 'wall': 0 }
+    result['cpu'] = usage.ru_utime + usage.ru_stime
+    result['peak_rss_kb'] = usage.ru_maxrss
+    written = result.pop('written', None)
+    result['bytes_written'] = written if written is not None else max(0, dirbytes(rundir) - before)
+    return result
+
+def report(result, name, stage, fixtures):
+    frames = sum(fixture['duration'] * FIXTURE_RATE for fixture in fixtures)
+    inputbytes = sum(os.path.getsize(fixture['path']) for fixture in fixtures)
+    wall = result['wall']
+    result['fixture'] = name
+    result['stage'] = stage
+    result['fps'] = frames / wall if wall > 0 else 0
+    result['mb_per_s'] = inputbytes / 1024 / 1024 / wall if wall > 0 else 0
+    return result
+
+def dirbytes(dirpath):
+    total = 0
+    for root, dirs, files in os.walk(dirpath):
+        for file in files:
+            total += os.path.getsize(os.path.join(root, file))
+    return total
+
+def getenv(jobs):
+    return {
+        'date': datetime.now(timezone.utc).isoformat(),
+        'commit': getoutput(['git', 'rev-parse', 'HEAD']),
+        'ffmpeg': getoutput([FFMPEG, '-version']).split("\n")[0],
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'jobs': jobs }
+
+def getoutput(cmd):
+    try:
+        return subprocess.check_output(cmd, stderr=subprocess.DEVNULL, cwd=SCRIPTS_DIR).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+# LOGS *********************************************************************
+
+def logconfig(workdir, output, jobs):
+    print("")
+    print("---------------------------- Configuration ----------------------------")
+    print("")
+    print(f"workdir: {workdir}")
+    print(f"output: {output}")
+    print(f"jobs: {jobs}")
+    print(f"fixtures: {[fixture['name'] for fixture in FIXTURES]}")
+    print(f"stages: {STAGES}")
+    print("")
+
+def logresults(results):
+    print("")
+    print("------------------------------- Results -------------------------------")
+    print("")
+    print(f"fixture;stage;ok;wall;cpu;fps;mb_per_s;peak_rss_kb;bytes_written;")
+    for result in results:
+        print(f"{result['fixture']};{result['stage']};{result['ok']};{result['wall']:.2f};{result['cpu']:.2f};{result['fps']:.1f};{result['mb_per_s']:.2f};{result['peak_rss_kb']};{result['bytes_written']};")
+    print("")
+
+# SCRIPT **********************************************************************
+
+def main(argv):
+    argd = getargs(argv, [
+        { 'opt':'workdir',  'defarg':WORKDIR },
+        { 'opt':'output',  'defarg':os.path.join(WORKDIR, 'benchmark.json') },
+        { 'opt':'jobs',  'defarg':'1' }])
+    workdir = argd.get("workdir")
+    output = argd.get("output")
+    jobs = int(argd.get("jobs"))
+    print("FFMEPG Benchmark (Linux)")
+    print(f'Exec. path : {os.getcwd()}')
+    process(workdir, output, jobs)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,4 @@
+# rename, reencode and clean stages sharing one core (items, folder scan, probe cache, runner, report)
+# the ffmpeg-*.py scripts at the root are thin wrappers around these modules
+from .core import Item
+from .pipeline import process
@@ -0,0 +1,235 @@
+import sys, os, subprocess
+from os.path import exists
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from .core import (FFMPEG, REPORT_FILE, Item, listfiles, walkfiles, probeitem, ffprobeexec, summarize, loadprobecache, saveprobecache,
+    replacesuffix, openreport, timed, filesize, runcmd, logreport, getargs)
+from .reencode import OUTPUT_SUFFIX, JOURNAL_FILE, CLAIM_SUFFIX, temppath, loadjournal, journaloutputs, journalmuxed
+
+# STATIC **********************************************************************
+
+FILTER = '_temp'
+SCRATCH = "" # folder for intermediates given to ffmpegcamera.reencode, "" : next to the input
+TRASH = "" # originals moved to this folder instead of deleted, "" : delete
+DRYRUN = False
+VERIFY_JOBS = 4
+VERIFY_DURATION = 0.5 # seconds of difference allowed between source and output
+VERIFY_FRAMES = 2 # frames of difference allowed
+VERIFY_DECODE_SECONDS = 2 # decoded from the start of the output, 0 : probe only
+FILTER_EXCLUDES = ['.*']
+RECURSIVE = False
+REPORT_SCRIPT = 'clean'
+
+# PRIVATE *********************************************************************
+
+def process(videosdirpath, recursive=RECURSIVE, reportpath=None, scratch=SCRATCH, trash=TRASH, dryrun=DRYRUN, files=None):
+    print("Start")
+    logconfig(videosdirpath, scratch, trash, dryrun)
+    openreport(reportpath or os.path.join(videosdirpath, REPORT_FILE), REPORT_SCRIPT)
+    loadprobecache(videosdirpath)
+
+    print("Step 1 : Find")
+    found = getfiles(videosdirpath, FILTER, recursive) if files is None else listfiles(files)
+
+    print("Step 2 : Verify outputs & clean verified")
+    try:
+        items = cleanbatch(found, scratch, trash, dryrun)
+    finally:
+        saveprobecache(videosdirpath)
+    logreport()
+    return items
+
+# clean stage over found items: outputs verified in parallel, then originals of the verified ones removed
+def cleanbatch(found, scratch=SCRATCH, trash=TRASH, dryrun=DRYRUN):
+    items = []
+    with ThreadPoolExecutor(max_workers=VERIFY_JOBS) as pool:
+        futures = []
+        for item in found:
+            items.append(item)
+            futures.append(pool.submit(timed, 'verify', item.input, verifyitem, item))
+        for future in futures:
+            future.result()
+    for item in items:
+        if not item.verified:
+            print(f"keep {item.input}: {item.reason}")
+        elif dryrun:
+            print(f"would {'move' if trash else 'del'} {item.input} ({item.reclaimed} bytes)")
+        else:
+            timed('clean', item.input, cleanitem, item, FILTER, scratch, trash)
+    logreclaimed(items, trash, dryrun)
+    return items
+
+def cleanitem(item, filter, scratch=SCRATCH, trash=TRASH):
+    deltempfolder(item, filter)
+    if scratch:
+        delscratchfolder(item, scratch)
+    if trash:
+        moveinputfile(item, trash)
+    else:
+        delinputfile(item)
+    delclaimfile(item, CLAIM_SUFFIX)
+
+# VERIFY *********************************************************************
+
+def verifyitem(item):
+    item.output = replacesuffix(item.input, OUTPUT_SUFFIX)
+    item.reason = checkoutput(item)
+    item.verified = not item.reason
+    item.reclaimed = filesize(item.input) + dirsize(f"{item.input}{FILTER}")
+
+# reason why the original must be kept, "" when the output matches it
+def checkoutput(item):
+    if not os.path.isfile(item.input):
+        return "input missing"
+    if filesize(item.output) == 0:
+        return f"no output {item.output}"
+    try:
+        # the source probe cached by ffmpegcamera.reencode, while size, mtime and inode are unchanged
+        source = probeitem(item)
+        output = summarize(ffprobeexec(item.output))
+    except (subprocess.SubprocessError, ValueError) as error:
+        return f"probe failed ({error})"
+    if abs(source.duration - output.duration) > VERIFY_DURATION:
+        return f"duration {output.duration:.2f}s, source {source.duration:.2f}s"
+    if streamcount(output) != streamcount(source):
+        return f"{streamcount(output)} streams, source {streamcount(source)}"
+    if source.frames and output.frames and abs(source.frames - output.frames) > VERIFY_FRAMES:
+        return f"{output.frames} frames, source {source.frames}"
+    if VERIFY_DECODE_SECONDS and not decodes(item.output):
+        return "output does not decode"
+    return ""
+
+def decodes(path):
+    cmd = [FFMPEG, '-v', 'error', '-t', f"{VERIFY_DECODE_SECONDS}", '-i', path, '-f', 'null', '-']
+    try:
+        out = runcmd(cmd, 'verify', echo=False)
+    except subprocess.SubprocessError:
+        return False
+    return not out.stderr.strip()
+
+# the encode keeps the first video and the first audio stream (cover excluded)
+def streamcount(probe):
+    return int(probe.video >= 0) + int(probe.audio >= 0)
+
+# FUNCTIONS *********************************************************************
+
+def deltempfolder(item, ext):
+    myfile = f"{item.input}{ext}"
+    if os.path.isdir(myfile):
+        print(f"del {myfile}")
+        shutil.rmtree(myfile, ignore_errors=False, onerror=None)  
+
+def delscratchfolder(item, scratch):
+    myfile = temppath(item.input, scratch)
+    if os.path.isdir(myfile):
+        print(f"del {myfile}")
+        shutil.rmtree(myfile, ignore_errors=False, onerror=None)
+
+# name-1.ext, name-2.ext... when the trash already has this name
+def moveinputfile(item, trash):
+    os.makedirs(trash, exist_ok=True)
+    name, ext = os.path.splitext(os.path.basename(item.input))
+    myfile = os.path.join(trash, f"{name}{ext}")
+    index = 1
+    while exists(myfile):
+        myfile = os.path.join(trash, f"{name}-{index}{ext}")
+        index = index + 1
+    print(f"move {item.input} {myfile}")
+    shutil.move(item.input, myfile)
+
+def delinputfile(item):
+    myfile = item.input
+    if os.path.isfile(myfile):
+        print(f"del {myfile}")
+        os.remove(myfile)
+
+def delclaimfile(item, suffix):
+    myfile = f"{item.input}{suffix}"
+    if os.path.isfile(myfile):
+        print(f"del {myfile}")
+        os.remove(myfile)
+
+# inputs with a temp folder, then inputs muxed according to the journal (temp folders removed after mux)
+def getfiles(path, filter, recursive=RECURSIVE):
+    files = walkfiles(path, [f"*{filter}"], FILTER_EXCLUDES, recursive, dirs=True)
+    seen = set()
+    index = 0
+    for file in files:
+        item = Item()
+        item.index = index
+        item.input = file[:-len(filter)]
+        seen.add(os.path.abspath(item.input))
+        yield item
+        index = index + 1
+    for input in journalinputs(path):
+        if input in seen:
+            continue
+        item = Item()
+        item.index = index
+        item.input = input
+        yield item
+        index = index + 1
+
+def journalinputs(dirpath):
+    loadjournal(dirpath, compact=False)
+    outputs = journaloutputs()
+    # a ladder proxy encoded again by a later run is an output, never an original to clean
+    return [input for input, output in journalmuxed().items() if input not in outputs and os.path.isfile(input) and output and exists(output)]
+
+def dirsize(dirpath):
+    total = 0
+    for root, dirs, files in os.walk(dirpath):
+        for file in files:
+            total += os.path.getsize(os.path.join(root, file))
+    return total
+
+# LOGS *********************************************************************
+
+def logconfig(path, scratch=SCRATCH, trash=TRASH, dryrun=DRYRUN):
+    print("")
+    print("---------------------------- Configuration ----------------------------")
+    print("")
+    print(f"Input")
+    print(f"folder: {path}")
+    print(f"journal: {JOURNAL_FILE}")
+    print(f"scratch: {scratch or 'next to the input'}")
+    print("")
+    print(f"Output")
+    print(f"name: *{OUTPUT_SUFFIX}")
+    print(f"verify: duration +-{VERIFY_DURATION}s, streams, frames +-{VERIFY_FRAMES}, decode {VERIFY_DECODE_SECONDS}s ({VERIFY_JOBS} jobs)")
+    print(f"originals: {f'moved to {trash}' if trash else 'deleted'}{' (dry run)' if dryrun else ''}")
+    print("")
+
+def logreclaimed(items, trash=TRASH, dryrun=DRYRUN):
+    verified = [item for item in items if item.verified]
+    reclaimed = sum(item.reclaimed for item in verified)
+    print("")
+    print("------------------------------ Reclaimed ------------------------------")
+    print("")
+    print(f"verified: {len(verified)}/{len(items)}")
+    print(f"{'would be ' if dryrun else ''}{'moved' if trash else 'reclaimed'}: {reclaimed} bytes ({reclaimed / 1024 / 1024:.1f} MB)")
+    print("")
+
+# SCRIPT **********************************************************************
+
+def main(argv):
+    argd = getargs(argv, [
+        { 'opt':'dirpath',  'defarg':'.' },
+        { 'opt':'recursive',  'defarg':f"{RECURSIVE}" },
+        { 'opt':'report', 'shortopt':'o', 'defarg':'' },
+        { 'opt':'scratch', 'shortopt':'w', 'defarg':SCRATCH },
+        { 'opt':'trash',  'defarg':TRASH },
+        { 'opt':'dryrun', 'shortopt':'n', 'defarg':f"{DRYRUN}" }])
+    dirpath = argd.get("dirpath")
+    recursive = argd.get("recursive") == 'True'
+    reportpath = argd.get("report")
+    scratch = argd.get("scratch")
+    trash = argd.get("trash")
+    dryrun = argd.get("dryrun") == 'True'
+    print("FFMEPG clean temp and old files")
+    print(f'Exec. path : {os.getcwd()}')
+    # TODO: install()
+    process(dirpath, recursive, reportpath, scratch, trash, dryrun)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
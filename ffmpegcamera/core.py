@@ -0,0 +1,572 @@
+import sys, os, getopt, subprocess, pathlib, json
+from datetime import datetime, timezone
+from os.path import exists
+import threading, time, fnmatch
+import asyncio
+from dataclasses import dataclass
+try:
+    import resource
+except ImportError:
+    # Windows: no child cpu time
+    resource = None
+
+# STATIC **********************************************************************
+
+# tools from PATH (.exe builds on Windows)
+EXE = '.exe' if os.name == 'nt' else ''
+FFPROBE = f"ffprobe{EXE}"
+FFMPEG = f"ffmpeg{EXE}"
+MP4BOX = f"MP4Box{EXE}"
+
+RUN_LIMITS = { 'probe':4 } # commands of a kind running at once, others wait
+RUN_TIMEOUTS = { 'probe':60, 'thumb':120, 'count':600, 'audio':1800, 'mux':1800, 'split':1800, 'sample':600, 'verify':120 } # seconds, encodes: none
+
+PROBE_CACHE_FILE = '.ffprobe-cache.json'
+REPORT_FILE = '.ffmpeg-report.jsonl'
+REPORT_TOP = 5
+
+# PUBLIC **********************************************************************
+
+# what the stages need from ffprobe: first video stream (cover excluded), first audio stream and format
+@dataclass(slots=True)
+class Probe:
+    codec: str = "" # "" : no video stream
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    frames: int = 0 # 0 : not in the header
+    duration: float = 0.0 # seconds
+    bitrate: int = 0 # bits/s of the file
+    videobitrate: int = 0 # bits/s of the video stream, of the file when missing
+    creation_time: str = ""
+    model: str = "" # camera model from the tags
+    video: int = -1 # stream indexes, -1 : none
+    audio: int = -1
+    cover: int = -1
+
+# one file through the stages: rename (datestr, target, newname), encode (output, temp, thumb...), clean (verified...)
+@dataclass(slots=True)
+class Item:
+    index: int = 0
+    input: str = ""
+    ext: str = ""
+    probe: Probe = None # summary kept from the first probe
+    datestr: str = ""
+    target: str = ""
+    newname: str = ""
+    output: str = ""
+    temp: str = ""
+    thumb: str = ""
+    video: str = ""
+    audio: str = ""
+    elapsed: float = 0.0
+    mode: str = ""
+    written: int = 0
+    fingerprint: str = ""
+    duplicate: str = ""
+    action: str = "encode" # encode, remux or skip
+    preset: str = ""
+    crf: int = 0
+    verified: bool = False
+    reason: str = ""
+    reclaimed: int = 0
+    proxies: list = None # outputs of the ladder rungs
+
+PROBE_CACHE = {}
+PROBE_CACHE_LOCK = threading.Lock()
+REPORT_PATH = None
+REPORT_SCRIPT = ""
+REPORT_RUN = ""
+REPORT_RECORDS = []
+REPORT_LOCK = threading.Lock()
+RUNNER_LOOP = None
+RUNNER_LOCK = threading.Lock()
+RUNNER_PROCS = set()
+RUNNER_SEMAPHORES = {}
+RUNNER_CANCELLED = threading.Event()
+
+# FUNCTIONS *********************************************************************
+
+def getfiles(path, includes, excludes, recursive=False):
+    files = walkfiles(path, includes, excludes, recursive)
+    index = 0
+    for file in files:
+        item = Item()
+        item.index = index
+        item.input = file
+        yield item
+        index = index + 1
+
+# given files instead of a folder scan (watch mode)
+def listfiles(files):
+    index = 0
+    for file in files:
+        item = Item()
+        item.index = index
+        item.input = file
+        yield item
+        index = index + 1
+
+def walkfiles(path, includes, excludes, recursive=True, dirs=False):
+    try:
+        with os.scandir(path) as entries:
+            entries = list(entries)
+    except OSError as error:
+        print(f"Skip {path}: {error}")
+        return
+    subdirs = []
+    for entry in entries:
+        if matches(entry.name, excludes):
+            continue
+        isdir = entry.is_dir(follow_symlinks=False)
+        if isdir == dirs and matches(entry.name, includes):
+            yield entry.path
+        elif isdir and recursive:
+            subdirs.append(entry.path)
+    for subdir in subdirs:
+        yield from walkfiles(subdir, includes, excludes, recursive, dirs)
+
+def matches(name, patterns):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def filterbyext(items, exts):
+    for item in items:
+        ext = pathlib.Path(item.input).suffix
+        ext = ext.replace('.','')
+        ext = ext.lower()
+        if not ext in exts:
+            continue
+        item.ext = ext
+        yield item
+
+# PROBE *********************************************************************
+
+# https://github.com/gbstack/ffprobe-python
+def FFProbe(path):
+    key = os.path.abspath(path)
+    stat = probestat(path)
+    with PROBE_CACHE_LOCK:
+        entry = PROBE_CACHE.get(key)
+    if entry is not None and entry[0] == stat:
+        return entry[1]
+    probe = summarize(timed('probe', path, ffprobeexec, path))
+    with PROBE_CACHE_LOCK:
+        PROBE_CACHE[key] = (stat, probe)
+    return probe
+
+# the summary kept on the item, probed (or read from the cache) on first use
+def probeitem(item):
+    if item.probe is None:
+        item.probe = FFProbe(item.input)
+    return item.probe
+
+def ffprobeexec(path):
+    cmd = [FFPROBE, '-show_format', '-show_streams', '-loglevel', 'quiet', '-print_format', 'json', path]
+    json_data = runcmd(cmd, 'probe').stdout
+    json_object = json.loads(json_data)
+    return json_object
+
+def summarize(metadata):
+    probe = Probe()
+    format = metadata.get("format", {})
+    probe.duration = float(format.get("duration") or 0)
+    probe.bitrate = int(format.get("bit_rate") or 0)
+    tags = dict(format.get("tags", {}))
+    for position, stream in enumerate(metadata.get("streams", [])):
+        index = stream.get('index', position)
+        if is_cover(stream):
+            probe.cover = index if probe.cover < 0 else probe.cover
+        elif is_video(stream) and probe.video < 0:
+            probe.video = index
+            probe.codec = codec(stream)
+            probe.width = int(stream.get('width') or 0)
+            probe.height = int(stream.get('height') or 0)
+            probe.fps = framerate(stream)
+            probe.frames = int(stream.get('nb_frames') or 0)
+            probe.videobitrate = int(stream.get('bit_rate') or 0) or probe.bitrate
+            tags.update(stream.get("tags", {}))
+        elif is_audio(stream) and probe.audio < 0:
+            probe.audio = index
+        probe.creation_time = probe.creation_time or stream.get('tags', {}).get('creation_time', "")
+    probe.model = cameramodel(tags)
+    return probe
+
+def framerate(stream):
+    rate = stream.get('avg_frame_rate') or stream.get('r_frame_rate') or "0/1"
+    num, _, den = rate.partition('/')
+    if not den or float(den) == 0:
+        return float(num or 0)
+    return float(num) / float(den)
+
+def cameramodel(tags):
+    for name in ['com.apple.quicktime.model', 'model', 'handler_name', 'encoder']:
+        if tags.get(name):
+            return tags[name].strip()
+    return ""
+
+# field values in order: no key names repeated in each cache entry
+def packprobe(probe):
+    return [getattr(probe, name) for name in Probe.__slots__]
+
+def unpackprobe(values):
+    # entry of a cache written before summaries: the full ffprobe json
+    if isinstance(values, dict):
+        return summarize(values)
+    return Probe(*values)
+
+# rename keeps size, mtime and inode: only the key moves
+def moveprobecache(oldpath, newpath):
+    with PROBE_CACHE_LOCK:
+        entry = PROBE_CACHE.pop(os.path.abspath(oldpath), None)
+        if entry is not None:
+            PROBE_CACHE[os.path.abspath(newpath)] = entry
+
+# cache entry is valid while path, size, mtime and inode are unchanged
+def probestat(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+def loadprobecache(dirpath):
+    filepath = os.path.join(dirpath, PROBE_CACHE_FILE)
+    with PROBE_CACHE_LOCK:
+        PROBE_CACHE.clear()
+    if not exists(filepath):
+        return
+    try:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        print(f"Probe cache {filepath} ignored (unreadable)")
+        return
+    entries = {}
+    for key, entry in data.items():
+        if isinstance(entry, dict):
+            entry = [entry['stat'], entry['probe']]
+        try:
+            entries[key] = (entry[0], unpackprobe(entry[1]))
+        except (TypeError, KeyError, ValueError):
+            continue
+    with PROBE_CACHE_LOCK:
+        PROBE_CACHE.update(entries)
+
+def saveprobecache(dirpath):
+    filepath = os.path.join(dirpath, PROBE_CACHE_FILE)
+    with PROBE_CACHE_LOCK:
+        data = { key: [stat, packprobe(probe)] for key, (stat, probe) in PROBE_CACHE.items() if exists(key) }
+    tmppath = f"{filepath}.tmp"
+    with open(tmppath, 'w', encoding='utf-8') as file:
+        json.dump(data, file, separators=(',', ':'))
+    os.replace(tmppath, filepath)
+
+# https://github.com/gbstack/ffprobe-python
+def is_video(json):
+    return json['codec_type'] == 'video'
+
+def is_audio(json):
+    return json['codec_type'] == 'audio'
+
+def is_cover(json):
+    return json.get('disposition', {}).get('attached_pic', 0) == 1
+
+# https://github.com/gbstack/ffprobe-python
+def codec(json):
+    return json['codec_name']
+
+# only the extension: the input name is also in its temp folder (<input>_temp/split/part000.mp4)
+def replacesuffix(path, suffix):
+    root, ext = os.path.splitext(path)
+    return f"{root}{suffix}"
+
+# REPORT *********************************************************************
+
+# script: reencodex265, renamectime, clean or pipeline, written in each record
+def openreport(filepath, script):
+    global REPORT_PATH, REPORT_SCRIPT, REPORT_RUN
+    REPORT_PATH = filepath
+    REPORT_SCRIPT = script
+    REPORT_RUN = datetime.now(timezone.utc).isoformat()
+    with REPORT_LOCK:
+        REPORT_RECORDS.clear()
+
+# wall time, child processes cpu time and sizes of a stage (cpu is approximate when stages run concurrently)
+def timed(stage, input, function, *args, outputpath=None):
+    inputbytes = filesize(input)
+    start = time.perf_counter()
+    cpu = childcpu()
+    result = function(*args)
+    report(stage, input, time.perf_counter() - start, childcpu() - cpu, inputbytes, filesize(outputpath))
+    return result
+
+# pixels: width x height x frames encoded, on item records (speed calibration of the reencode plan)
+def report(stage, input, wall, cpu, inputbytes=0, outputbytes=0, pixels=None):
+    record = {
+        'run': REPORT_RUN,
+        'script': REPORT_SCRIPT,
+        'stage': stage,
+        'input': os.path.abspath(input),
+        'wall': round(wall, 3),
+        'cpu': round(cpu, 3),
+        'input_bytes': inputbytes,
+        'output_bytes': outputbytes,
+        'ratio': round(inputbytes / outputbytes, 3) if outputbytes else None,
+        'pixels': pixels }
+    with REPORT_LOCK:
+        REPORT_RECORDS.append(record)
+        if REPORT_PATH is None:
+            return
+        with open(REPORT_PATH, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record) + "\n")
+
+# records of previous runs (and of this one) from the report file
+def readreport(stage=None):
+    records = []
+    if REPORT_PATH is None or not exists(REPORT_PATH):
+        return records
+    with open(REPORT_PATH, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # line cut by an interrupted run
+                continue
+            if stage is None or record.get('stage') == stage:
+                records.append(record)
+    return records
+
+def childcpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def filesize(filepath):
+    if filepath and os.path.isfile(filepath):
+        return os.path.getsize(filepath)
+    return 0
+
+# RUNNER *********************************************************************
+
+# commands run as argv lists (no shell) on one event loop thread, the worker threads wait for their result
+def runcmd(argv, kind, timeout=None, echo=True, progress=None):
+    if RUNNER_CANCELLED.is_set():
+        raise asyncio.CancelledError(f"{kind} not started: {argv[0]}")
+    timeout = timeout if timeout is not None else RUN_TIMEOUTS.get(kind, 0)
+    future = asyncio.run_coroutine_threadsafe(runlimited(argv, kind, timeout, echo, progress), startrunner())
+    return future.result()
+
+def startrunner():
+    global RUNNER_LOOP
+    with RUNNER_LOCK:
+        if RUNNER_LOOP is None:
+            RUNNER_LOOP = asyncio.new_event_loop()
+            threading.Thread(target=RUNNER_LOOP.run_forever, daemon=True).start()
+        return RUNNER_LOOP
+
+async def runlimited(argv, kind, timeout, echo, progress=None):
+    limit = RUN_LIMITS.get(kind)
+    if not limit:
+        return await runasync(argv, kind, timeout, echo, progress)
+    semaphore = RUNNER_SEMAPHORES.setdefault(kind, asyncio.Semaphore(limit))
+    async with semaphore:
+        return await runasync(argv, kind, timeout, echo, progress)
+
+async def runasync(argv, kind, timeout, echo, progress=None):
+    if RUNNER_CANCELLED.is_set():
+        raise asyncio.CancelledError(f"{kind} not started: {argv[0]}")
+    proc = await asyncio.create_subprocess_exec(*argv, stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, limit=1024 * 1024)
+    RUNNER_PROCS.add(proc)
+    try:
+        stdout = proc.stdout.read() if progress is None else readprogress(proc.stdout, progress)
+        reads = asyncio.gather(stdout, readstderr(proc.stderr, kind, echo), proc.wait())
+        stdout, stderr, _ = await asyncio.wait_for(reads, timeout or None)
+    except asyncio.TimeoutError:
+        print(f"{kind} timed out after {timeout}s, killed: {argv[-1]}")
+        await killproc(proc)
+        raise subprocess.TimeoutExpired(argv, timeout)
+    except asyncio.CancelledError:
+        await killproc(proc)
+        raise
+    finally:
+        RUNNER_PROCS.discard(proc)
+    if RUNNER_CANCELLED.is_set():
+        raise asyncio.CancelledError(f"{kind} killed: {argv[0]}")
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, argv, stdout, stderr)
+    return subprocess.CompletedProcess(argv, proc.returncode, stdout, stderr)
+
+# print stderr lines as they come, and keep them for the error
+async def readstderr(stream, kind, echo):
+    lines = []
+    async for line in stream:
+        lines.append(line)
+        text = line.decode(errors='replace').rstrip()
+        if echo and text:
+            print(f"[{kind}] {text}")
+    return b"".join(lines)
+
+# -progress pipe:1 blocks of key=value lines, each ended by progress=continue or progress=end
+async def readprogress(stream, progress):
+    block = {}
+    async for line in stream:
+        key, _, value = line.decode(errors='replace').strip().partition('=')
+        block[key] = value
+        if key == 'progress':
+            progress(block)
+            block = {}
+    return b""
+
+async def killproc(proc):
+    if proc.returncode is None:
+        proc.kill()
+    await proc.wait()
+
+# Ctrl-C: no new command, running ones killed (no orphaned ffmpeg)
+def stoprunner():
+    RUNNER_CANCELLED.set()
+    with RUNNER_LOCK:
+        loop = RUNNER_LOOP
+    if loop is None:
+        return
+    future = asyncio.run_coroutine_threadsafe(killall(), loop)
+    future.result(timeout=30)
+
+async def killall():
+    procs = list(RUNNER_PROCS)
+    for proc in procs:
+        if proc.returncode is None:
+            proc.kill()
+    if procs:
+        print(f"Killed {len(procs)} running commands")
+
+# LOGS *********************************************************************
+
+def logreport():
+    with REPORT_LOCK:
+        records = list(REPORT_RECORDS)
+    print("")
+    print("-------------------------------- Report -------------------------------")
+    print("")
+    print(f"file: {REPORT_PATH}")
+    print("stage;count;wall;cpu;input MB;output MB;")
+    for stage in sorted(set(record['stage'] for record in records)):
+        staged = [record for record in records if record['stage'] == stage]
+        wall = sum(record['wall'] for record in staged)
+        cpu = sum(record['cpu'] for record in staged)
+        inputmb = sum(record['input_bytes'] for record in staged) / 1024 / 1024
+        outputmb = sum(record['output_bytes'] for record in staged) / 1024 / 1024
+        print(f"{stage};{len(staged)};{wall:.1f};{cpu:.1f};{inputmb:.1f};{outputmb:.1f};")
+    print("")
+    print("slowest;wall;ratio;input;")
+    slowest = sorted(records, key=lambda record: record['wall'], reverse=True)[:REPORT_TOP]
+    for record in slowest:
+        print(f"{record['stage']};{record['wall']:.1f};{record['ratio']};{record['input']};")
+    print("")
+
+# UTILS *********************************************************************
+
+# https://www.tutorialspoint.com/python/python_command_line_arguments.htm
+def getargs(argv, configs, helpmsg=None):
+    """getargs(argv, configs, helpmsg)
+    
+    Return dictionnary with long opt names as keys and arg as values. 
+    From Reading command line arguments, using short or long opt names with default values from configs object.
+
+    Parameters
+    ----------
+    argv
+        |sys.argv[1:]|
+    configs
+        |array<dictionnary['opt':str,'shortopt':str,'longopt':str,'defarg':str]>|
+        example : [{'opt':'myopt'},...] or [{'shortopt':'mo','longopt':'myopt','defarg':'False'},...]
+    helpmsg
+        |str(optionnal)|
+        example : 'python myscript.py -m <myopt>'
+
+    Returns
+    -------
+    dictionnary[key(longopt):str(arg or defarg)]
+
+    Usage
+    -----
+    argv = sys.argv[1:]
+
+    helpmsg = 'python myscript.py -m <myopt>'
+
+    configs = [{ 'opt':'myopt', 'defarg':'False' } ]
+
+    argdic = getargs(argv, configs, helpmsg)
+
+    myoptarg = argdic.get('myopt')
+    """
+    shortopts = "h"
+    longopts = []
+    defhelpmsg = 'Usage: python [script].py'
+    for conf in configs:
+        # DEF VALS
+        if not 'longopt' in conf.keys():
+            conf['longopt'] = conf['opt']
+        if not 'shortopt' in conf.keys():
+            conf['shortopt'] = conf['longopt'][0]
+        if not 'defarg' in conf.keys():
+            conf['defarg'] = None
+        # BUILD PARAMS ('shortopt':'' : long opt only)
+        if conf['shortopt']:
+            shortopts += f"{conf['shortopt']}:"
+        longopts.append(f"{conf['longopt']}=")
+        defhelpmsg += f" --{conf['longopt']} <{conf['defarg']}>"
+    help = defhelpmsg if helpmsg is None else helpmsg
+    # READ OPT
+    try:
+        opts, args = getopt.getopt(argv,shortopts,longopts)
+    except getopt.GetoptError:
+        print(help)
+        sys.exit(2)
+    # GET ARGS
+    res = {}
+    for opt, arg in opts:
+        if opt == '-h':
+            print(help)
+            sys.exit()
+        else:
+            for conf in configs:
+                if opt == f"--{conf['longopt']}" or (conf['shortopt'] and opt == f"-{conf['shortopt']}"):
+                    res[conf['longopt']] = arg
+                    continue
+    # DEFAULT ARGS
+    print("Running default command line with: ")
+    for conf in configs:
+        if not conf['longopt'] in res.keys():
+            res[conf['longopt']] = conf['defarg']
+        print(f"argument --{conf['longopt']}: '{res[conf['longopt']]}'")
+    return res
+
+def splitpatterns(arg):
+    return [pattern.strip() for pattern in arg.split(',') if pattern.strip()]
+
+def parsebool(arg):
+    return arg == 'True'
+
+# keyword arguments of the configs with a 'kwarg', each arg read by the config 'parse' function
+def parsekwargs(argd, configs):
+    return { conf['kwarg']: conf['parse'](argd.get(conf['opt'])) for conf in configs if 'kwarg' in conf }
+
+# configs without the short opts already taken by others (long opt only)
+def mergeargs(configs, others):
+    taken = { conf.get('shortopt', conf['opt'][0]) for conf in configs }
+    merged = [dict(conf) for conf in configs]
+    for conf in others:
+        conf = dict(conf)
+        shortopt = conf.get('shortopt', conf['opt'][0])
+        conf['shortopt'] = "" if shortopt in taken else shortopt
+        taken.add(conf['shortopt'])
+        merged.append(conf)
+    return merged
+
+# bytes, or with a K, M, G or T suffix (20G)
+def parsesize(arg):
+    arg = arg.strip().upper().rstrip('B')
+    units = { 'K':1024, 'M':1024 ** 2, 'G':1024 ** 3, 'T':1024 ** 4 }
+    if arg and arg[-1] in units:
+        return int(float(arg[:-1]) * units[arg[-1]])
+    return int(arg or 0)
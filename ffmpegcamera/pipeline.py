@@ -0,0 +1,97 @@
+import sys, os
+from .core import (REPORT_FILE, getfiles, listfiles, filterbyext, loadprobecache, saveprobecache, openreport, logreport,
+    getargs, splitpatterns, parsekwargs, mergeargs)
+from . import rename as renamer, reencode, clean as cleaner
+
+# STATIC **********************************************************************
+
+FILTER_INCLUDES = ['*.*']
+FILTER_EXCLUDES = ['.*', '*_temp', f"*{reencode.OUTPUT_SUFFIX}"]
+FILTER_EXTS = sorted(set(renamer.FILTER_EXTS + reencode.FILTER_EXTS))
+RECURSIVE = False
+CLEAN = False
+ENCODED_MODES = ['direct', 'temp', 'resumed'] # outputs the clean stage may verify
+REPORT_SCRIPT = 'pipeline'
+
+# PRIVATE *********************************************************************
+
+# rename, encode (and clean) one item set: one folder scan and one probe cache for all the stages
+# renamed: called with the items once renamed, before the encode (ffmpeg-watch.py)
+def process(videosdirpath, recursive=RECURSIVE, includes=FILTER_INCLUDES, excludes=FILTER_EXCLUDES, reportpath=None, clean=CLEAN, trash=cleaner.TRASH, dryrun=cleaner.DRYRUN, files=None, renamed=None, **options):
+    print("Start")
+    logconfig(videosdirpath, recursive, includes, excludes, clean, trash, dryrun)
+    loadprobecache(videosdirpath)
+    openreport(reportpath or os.path.join(videosdirpath, REPORT_FILE), REPORT_SCRIPT)
+
+    print("Step 1 : Find")
+    found = getfiles(videosdirpath, includes, excludes, recursive) if files is None else listfiles(files)
+    items = list(filterbyext(found, FILTER_EXTS))
+
+    try:
+        print("Step 2 : Rename")
+        renamer.renamebatch(videosdirpath, items)
+        # the next stages work on the new names
+        for item in items:
+            if item.newname:
+                item.input = item.newname
+        if renamed is not None:
+            renamed(items)
+
+        print("Step 3 : Encode")
+        encoded = reencode.encodebatch(videosdirpath, items, **options)
+
+        if clean:
+            print("Step 4 : Clean")
+            cleaned = [item for item in encoded if item.mode in ENCODED_MODES]
+            cleaner.cleanbatch(cleaned, options.get('scratch', reencode.SCRATCH), trash, dryrun)
+    finally:
+        saveprobecache(videosdirpath)
+
+    print('End')
+    logreport()
+    return items
+
+# LOGS *********************************************************************
+
+def logconfig(path, recursive=RECURSIVE, includes=FILTER_INCLUDES, excludes=FILTER_EXCLUDES, clean=CLEAN, trash=cleaner.TRASH, dryrun=cleaner.DRYRUN):
+    print("")
+    print("---------------------------- Configuration ----------------------------")
+    print("")
+    print(f"folder: {path}")
+    print(f"recursive: {recursive}")
+    print(f"filter (includes): {includes}")
+    print(f"filter (excludes): {excludes}")
+    print(f"filter (exts): {FILTER_EXTS}")
+    print(f"stages: rename, encode{', clean' if clean else ''}")
+    if clean:
+        print(f"originals: {f'moved to {trash}' if trash else 'deleted'}{' (dry run)' if dryrun else ''}")
+    print("")
+
+# SCRIPT **********************************************************************
+
+# the options of ffmpegcamera.reencode, long opt only when the short one is taken here (--threads-per-job, --cores, --node)
+def main(argv):
+    argd = getargs(argv, mergeargs([
+        { 'opt':'dirpath',  'defarg':'.' },
+        { 'opt':'recursive',  'defarg':f"{RECURSIVE}" },
+        { 'opt':'include',  'defarg':",".join(FILTER_INCLUDES) },
+        { 'opt':'exclude',  'defarg':",".join(FILTER_EXCLUDES) },
+        { 'opt':'report', 'shortopt':'o', 'defarg':'' },
+        { 'opt':'clean',  'defarg':f"{CLEAN}" },
+        { 'opt':'trash',  'defarg':cleaner.TRASH },
+        { 'opt':'dryrun', 'shortopt':'n', 'defarg':f"{cleaner.DRYRUN}" }], reencode.ENCODE_ARGS))
+    dirpath = argd.get("dirpath")
+    recursive = argd.get("recursive") == 'True'
+    includes = splitpatterns(argd.get("include"))
+    excludes = splitpatterns(argd.get("exclude"))
+    reportpath = argd.get("report")
+    clean = argd.get("clean") == 'True'
+    trash = argd.get("trash")
+    dryrun = argd.get("dryrun") == 'True'
+    options = parsekwargs(argd, reencode.ENCODE_ARGS)
+    print("FFMEPG Rename, Re-encode & Clean")
+    print(f'Exec. path : {os.getcwd()}')
+    process(dirpath, recursive, includes, excludes, reportpath, clean, trash, dryrun, **options)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,1576 @@
+import sys, os, glob, subprocess, json
+from datetime import datetime, timezone, timedelta
+from os.path import exists
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import re, time, hashlib, shutil, platform
+import collections, heapq, statistics
+from .core import (FFPROBE, FFMPEG, MP4BOX, PROBE_CACHE_FILE, REPORT_FILE, RUN_LIMITS, RUNNER_CANCELLED,
+    getfiles, listfiles, filterbyext, probeitem, probestat, loadprobecache, saveprobecache,
+    replacesuffix, openreport, timed, report, readreport, filesize, runcmd, stoprunner, logreport, getargs, splitpatterns, parsesize, parsebool, parsekwargs, mergeargs)
+
+# STATIC **********************************************************************
+
+FILTER_EXTS = ['mp4', 'avi', 'mpeg4', 'mpeg']
+FILTER_EXCLUDE_CODECS = ['hevc', 'h265'] # ffprobe reports 'hevc': stream copy (remux) only
+MIN_BPP = 0.03 # bits per pixel under which re-encoding would not meaningfully shrink the file
+OUTPUT_SUFFIX = '-x265.mp4'
+FILTER_INCLUDES = ['*.*']
+FILTER_EXCLUDES = ['.*', '*_temp', f"*{OUTPUT_SUFFIX}"]
+RECURSIVE = False
+THUMB_SUFFIX = '.jpg'
+THUMB_CANDIDATES = 50 # keyframes compared by the thumbnail filter
+THUMB_MIN_LUMA = 40 # mean luma under which a keyframe is too dark for a cover (black intro)
+THUMB_SHEET = False # contact sheet <input>-sheet.jpg
+THUMB_SHEET_GRID = (4, 4)
+THUMB_SHEET_WIDTH = 320
+THUMB_STRIP = False # preview strip <input>-strip.jpg
+THUMB_STRIP_FRAMES = 8
+THUMB_STRIP_WIDTH = 160
+THUMB_JOBS = 2
+THUMB_WAIT = 60 # seconds the direct pass waits for its cover, attached afterwards when later
+RUN_LIMITS['thumb'] = THUMB_JOBS # covers extracted at once by the runner
+OUTPUT_DATE_REG = r'^[0-9]{8}_[0-9]{6}.*'
+OUTPUT_DATE_PREFIX = "%Y%m%d_%H%M%S-"
+METADATA_DATE_PTRN = "%Y-%m-%dT%H:%M:%S.%f%z"
+JOBS = 1
+THREADS_PER_JOB = 0 # 0 : cores / jobs
+LIGHT_JOBS = 2 # audio extraction
+MODE = 'direct' # direct : one ffmpeg pass to output, temp : intermediates muxed by MP4Box
+DEDUP = 'link' # link : hard link the output of an identical clip, skip : do not encode it, off
+DEDUP_FULLHASH = False # also hash the whole file, not only sampled blocks
+DEDUP_BLOCK = 64 * 1024
+TUNE = 'off' # ssim, psnr, vmaf : fastest preset reaching a quality, size : fastest preset under a size ratio
+TUNE_TARGETS = { 'ssim':0.98, 'psnr':40.0, 'vmaf':93.0, 'size':0.5 }
+TUNE_PRESETS = ['veryfast', 'faster', 'fast', 'medium'] # fastest first
+TUNE_CRFS = [30, 28, 26, 24, 22] # smallest output first, best quality first for size
+TUNE_SAMPLES = 3
+TUNE_SAMPLE_SECONDS = 2
+TUNE_SAMPLE_RATIO = 0.5 # lossless FFV1 sample size over the raw 8 bit 4:2:0 frames
+SPLIT = 0 # segments encoded in parallel for one long video, 0 : off
+SPLIT_MIN_DURATION = 600 # seconds
+SPLIT_TOLERANCE = 0.5 # seconds allowed between the concatenated parts (frames / fps) and the source duration
+NODE = "" # distributed mode: name of this node, "" : off
+LEASE_SECONDS = 300 # claim abandoned by a node after this delay without heartbeat
+HEARTBEAT_SECONDS = 60
+QUALITY_FILTERS = { 'ssim':'ssim', 'psnr':'psnr', 'vmaf':'libvmaf' }
+QUALITY_REGS = { 'ssim':r'All:([0-9.]+)', 'psnr':r'average:([0-9.]+|inf)', 'vmaf':r'VMAF score:\s*([0-9.]+)' }
+PROBE_AHEAD = 8 # files probed ahead of the encodes
+SCRATCH = "" # folder for intermediates (tmpfs, local NVMe), "" : next to the input
+SCRATCH_QUOTA = 0 # bytes of intermediates at once, jobs wait under it, 0 : no quota
+SCRATCH_FREE = 1024 * 1024 * 1024 # bytes left free on the scratch volume
+SCRATCH_WAIT = 5 # seconds between free space checks while waiting
+PROGRESS_SECONDS = 10 # progress printed and metrics written at this interval
+PROGRESS_STALL = 120 # seconds without progress from ffmpeg before an encode is shown as stalled
+CONTROL = False # adaptive jobs (Linux): encodes started from load, memory and pressure, --jobs is the maximum
+CONTROL_SECONDS = 5 # sampling interval, one encode started at most per sample
+CONTROL_SETTLE = 30 # seconds after a change before one more encode is allowed (load and pressure catch up)
+CONTROL_LOAD = 0.9 # load average per core under which one more encode is allowed
+CONTROL_PRESSURE = { 'cpu':50.0, 'memory':10.0, 'io':30.0 } # PSI some avg10 %, cpu: no more encode, memory and io: one less
+CONTROL_JOB_MEMORY = 300 # bytes per pixel of a libx265 job (2.5 GB in 4K)
+CONTROL_FREE_MEMORY = 1024 * 1024 * 1024 # bytes of available memory kept free
+ORDER = 'none' # none : as found (encodes start while probing), shortest, longest (packing over jobs), deadline
+DEADLINE = "" # HH:MM or seconds, deadline order: most space saved before it first
+LADDER = "" # proxies from the decode of the archive encode: "<suffix>:<height>[:<crf>],...", "" : off
+LADDER_CRF = 28
+LADDER_PRESET = 'veryfast'
+PLAN_SPEED = 40000000 # pixels encoded per second by one job, until calibrated from the report
+PLAN_OUTPUT_BPP = 0.02 # bits per pixel of the outputs, until calibrated from the report
+PLAN_REMUX_SPEED = 50 # media seconds copied per second
+PLAN_HISTORY = 50 # last encodes of the report used for the calibration
+
+JOURNAL_FILE = '.reencode-journal.jsonl'
+JOURNAL_STAGES = ['probed', 'thumb', 'video', 'audio', 'muxed']
+JOURNAL_CHECKSUM = False # sha256 of the stage outputs written and compared on resume, else size and mtime only
+DEDUP_FILE = '.reencode-dedup.json'
+TUNE_FILE = '.reencode-tune.json'
+CLAIM_SUFFIX = '.claim'
+REPORT_SCRIPT = 'reencodex265'
+REPORT_STAGES = { 'savethumb':'thumb', 'savevideo':'video', 'saveaudio':'audio', 'reencode':'mux', 'savedirect':'direct' }
+
+# PUBLIC **********************************************************************
+
+JOURNAL = {}
+JOURNAL_PATH = None
+JOURNAL_SHA256 = False
+JOURNAL_LOCK = threading.Lock()
+DEDUP_INDEX = {}
+TUNE_CACHE = {}
+TUNE_LOCK = threading.Lock()
+CLAIMS = {}
+CLAIMS_LOCK = threading.Lock()
+SCRATCH_USED = 0
+SCRATCH_CONDITION = threading.Condition()
+PROGRESS = {}
+PROGRESS_BATCH = {}
+PROGRESS_LOCK = threading.Lock()
+CONTROL_STATE = { 'enabled': False }
+CONTROL_CONDITION = threading.Condition()
+
+# PRIVATE *********************************************************************
+
+def process(videosdirpath, jobs=JOBS, threadsperjob=THREADS_PER_JOB, cores=None, mode=MODE, recursive=RECURSIVE, includes=FILTER_INCLUDES, excludes=FILTER_EXCLUDES, dedup=DEDUP, fullhash=DEDUP_FULLHASH, reportpath=None, minbpp=MIN_BPP, tune=TUNE, tunetarget=None, split=SPLIT, splitmin=SPLIT_MIN_DURATION, node=NODE, lease=LEASE_SECONDS, scratch=SCRATCH, scratchquota=SCRATCH_QUOTA, sheet=THUMB_SHEET, strip=THUMB_STRIP, metricspath=None, adaptive=CONTROL, order=ORDER, deadline=DEADLINE, ladder=None, sha256=JOURNAL_CHECKSUM, files=None):
+    print("Start")
+    logconfig(videosdirpath, mode, recursive, includes, excludes, dedup, minbpp, tune, tunetarget or TUNE_TARGETS.get(tune))
+
+    print("Step 1 : Find")
+    loadprobecache(videosdirpath)
+    openreport(reportpath or os.path.join(videosdirpath, REPORT_FILE), REPORT_SCRIPT)
+    found = getfiles(videosdirpath, includes, excludes, recursive) if files is None else listfiles(files)
+
+    print("Step 2 : Prepare, Encode & Mux (as found)")
+    try:
+        items = encodebatch(videosdirpath, found, jobs, threadsperjob, cores, mode, dedup, fullhash, minbpp,
+            tune, tunetarget, split, splitmin, node, lease, scratch, scratchquota, sheet, strip, metricspath, adaptive, order, deadline, ladder, sha256)
+    finally:
+        saveprobecache(videosdirpath)
+
+    print('End')
+    logreport()
+    return items
+
+# encode stage over found items: a folder scan, given files or the items of ffmpegcamera.pipeline
+def encodebatch(videosdirpath, found, jobs=JOBS, threadsperjob=THREADS_PER_JOB, cores=None, mode=MODE, dedup=DEDUP, fullhash=DEDUP_FULLHASH, minbpp=MIN_BPP, tune=TUNE, tunetarget=None, split=SPLIT, splitmin=SPLIT_MIN_DURATION, node=NODE, lease=LEASE_SECONDS, scratch=SCRATCH, scratchquota=SCRATCH_QUOTA, sheet=THUMB_SHEET, strip=THUMB_STRIP, metricspath=None, adaptive=CONTROL, order=ORDER, deadline=DEADLINE, ladder=None, sha256=JOURNAL_CHECKSUM):
+    items = []
+    ladder = ladder or []
+    cores = cores or os.cpu_count() or 1
+    threads = getthreadsperjob(cores, jobs, threadsperjob)
+    tunetarget = tunetarget or TUNE_TARGETS.get(tune)
+    logscheduler(cores, jobs, threads, split, splitmin, node, lease, scratch, scratchquota, adaptive, order, deadline)
+    logladder(ladder)
+    # other nodes append to the shared journal: no compaction
+    loadjournal(videosdirpath, compact=not node, sha256=sha256)
+    loaddedup(videosdirpath)
+    loadtune(videosdirpath)
+    found = filterbyext(found, FILTER_EXTS)
+    found = filterbyoutputs(found, ladder)
+    found = prefetchprobes(found, PROBE_AHEAD)
+    found = filterbyexcludecodec(found, FILTER_EXCLUDE_CODECS, minbpp)
+    if order != 'none':
+        # ordering needs every probe: the first encode waits for the whole scan
+        found = planitems(list(found), order, jobs, deadline)
+
+    start = time.perf_counter()
+    heartbeat = startheartbeat(lease) if node else None
+    progress = startprogress(metricspath)
+    control = startcontrol(jobs, cores) if adaptive else None
+    RUNNER_CANCELLED.clear()
+    # heavy pool: libx265 jobs sharing the cores budget, light pool: audio extraction, thumbs pool: covers
+    try:
+        with ThreadPoolExecutor(max_workers=LIGHT_JOBS) as light, ThreadPoolExecutor(max_workers=THUMB_JOBS) as thumbs, ThreadPoolExecutor(max_workers=jobs) as heavy:
+            try:
+                futures = []
+                firsts = {}
+                for item in found:
+                    prepareitem(item)
+                    items.append(item)
+                    if dedup != 'off' and findduplicate(item, firsts, fullhash):
+                        continue
+                    args = (item, threads, (light, thumbs), mode, tune, tunetarget, split, splitmin, scratch, scratchquota, sheet, strip, ladder)
+                    queueprogress(item)
+                    if node:
+                        future = heavy.submit(encodeclaim, node, lease, *args)
+                    else:
+                        future = heavy.submit(encodeitem, *args)
+                    future.add_done_callback(lambda _, item=item: endprogress(item))
+                    futures.append(future)
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                # drop queued items and kill running commands before the pools wait for their workers
+                print("Interrupted, stopping ffmpeg")
+                light.shutdown(wait=False, cancel_futures=True)
+                thumbs.shutdown(wait=False, cancel_futures=True)
+                heavy.shutdown(wait=False, cancel_futures=True)
+                stoprunner()
+                raise
+        # duplicates wait for the output of their first copy
+        for item in items:
+            if item.duplicate:
+                linkduplicate(item, dedup)
+    finally:
+        if heartbeat is not None:
+            heartbeat.set()
+        progress.set()
+        if control is not None:
+            control.set()
+        savededup(videosdirpath, items)
+        savetune(videosdirpath)
+    walltime = time.perf_counter() - start
+
+    logcsv(items)
+    logtimes(items, walltime)
+    return items
+
+def prepareitem(item):
+    logsource(item)
+    item.output = item.input
+    setoutputcodec(item, OUTPUT_SUFFIX)
+    if not isjournaled(item, 'probed'):
+        journalstage(item, 'probed')
+
+# claimed when a worker is free, so idle nodes take the next items
+def encodeclaim(node, lease, item, *args):
+    if not claimitem(item, node, lease):
+        print(f"Claimed by another node: {item.input}")
+        item.mode = 'elsewhere'
+        return
+    try:
+        encodeitem(item, *args)
+    except BaseException:
+        releaseitem(item)
+        raise
+    doneitem(item, node)
+
+def encodeitem(item, threads, pools, mode, tune=TUNE, tunetarget=None, split=SPLIT, splitmin=SPLIT_MIN_DURATION, scratch=SCRATCH, scratchquota=SCRATCH_QUOTA, sheet=THUMB_SHEET, strip=THUMB_STRIP, ladder=None):
+    start = time.perf_counter()
+    logtarget(item)
+    if isjournaled(item, 'muxed', item.output):
+        print(f"Already encoded (journal): {item.output}")
+        item.mode = 'resumed'
+        return
+    # ladder and split encodes write raw .h265 streams: temp mode only, one decode for the whole ladder (no split)
+    rungs = ladderrungs(item, ladder or [])
+    splitting = split > 1 and item.action == 'encode' and not rungs and getduration(item) >= splitmin
+    need = scratchneed(item, mode, splitting, rungs, tune, tunetarget)
+    if not reservescratch(item, scratch, need, scratchquota):
+        item.mode = 'nospace'
+        return
+    try:
+        acquirejob(item)
+        try:
+            createtemp(item, scratch)
+            encodestages(item, threads, pools, mode, tune, tunetarget, split, splitting, sheet, strip, rungs)
+            item.written = writtenbytes(item)
+            # intermediates are not needed once muxed (the journal keeps the muxed record)
+            removetemp(item)
+        finally:
+            releasejob()
+    finally:
+        releasescratch(need)
+    item.elapsed = time.perf_counter() - start
+    pixels = itempixels(probeitem(item)) if item.action == 'encode' else None
+    report('item', item.input, item.elapsed, 0.0, filesize(item.input), filesize(item.output), pixels)
+
+def encodestages(item, threads, pools, mode, tune, tunetarget, split, splitting, sheet=THUMB_SHEET, strip=THUMB_STRIP, rungs=None):
+    light, thumbs = pools
+    direct = mode == 'direct' and not splitting and not rungs
+    # direct: the cheap keyframe cover alone, muxed by the encode pass, sheet and strip afterwards
+    thumbsheets = (False, False) if direct else (sheet, strip)
+    thumb = thumbs.submit(resumestage, item, 'thumb', os.path.join(item.temp, "thumb.jpg"), savethumb, item, *thumbsheets)
+    if tune != 'off' and item.action == 'encode':
+        timed('tune', item.input, tuneitem, item, tune, tunetarget, threads)
+    sheets = None
+    if direct:
+        try:
+            thumb.result(timeout=THUMB_WAIT)
+        except FutureTimeout:
+            print(f"Thumbnail not ready, cover attached after the encode: {item.input}")
+        try:
+            resumestage(item, 'muxed', item.output, savedirect, item, threads, thumb)
+            item.mode = 'direct'
+        except subprocess.CalledProcessError:
+            print(f"Direct encode failed, fallback to temp: {item.input}")
+        if sheet or strip:
+            sheets = thumbs.submit(timed, 'thumb', item.input, savesheets, item, sheet, strip)
+    if item.mode != 'direct':
+        audio = light.submit(resumestage, item, 'audio', os.path.join(item.temp, "audio.m4a"), saveaudio, item)
+        if rungs:
+            resumestage(item, 'video', os.path.join(item.temp, "video.h265"), savevideoladder, item, threads, rungs)
+        elif splitting:
+            resumestage(item, 'video', os.path.join(item.temp, "video.h265"), savevideosplit, item, threads, split)
+        else:
+            resumestage(item, 'video', os.path.join(item.temp, "video.h265"), savevideo, item, threads)
+        thumb.result()
+        audio.result()
+        logvideo(item)
+        # proxies first: the muxed archive marks the item as done
+        if rungs:
+            muxladder(item, rungs)
+        resumestage(item, 'muxed', item.output, reencode, item)
+        item.mode = 'temp'
+    if sheets is not None:
+        sheets.result()
+
+# FUNCTIONS *********************************************************************
+
+# probe the next files concurrently (bounded by RUN_LIMITS) while the first ones are prepared
+def prefetchprobes(items, ahead=PROBE_AHEAD):
+    with ThreadPoolExecutor(max_workers=ahead) as pool:
+        pending = collections.deque()
+        for item in items:
+            pending.append((item, pool.submit(probeitem, item)))
+            if len(pending) < ahead:
+                continue
+            item, future = pending.popleft()
+            future.result()
+            yield item
+        while pending:
+            item, future = pending.popleft()
+            future.result()
+            yield item
+
+# proxies of this ladder and files muxed by previous runs (any ladder) are outputs, not inputs
+def filterbyoutputs(items, ladder):
+    suffixes = tuple(rung['suffix'] for rung in ladder)
+    outputs = journaloutputs()
+    for item in items:
+        if suffixes and item.input.endswith(suffixes):
+            continue
+        if os.path.abspath(item.input) in outputs:
+            print(f"skip: {item.input} (output in the journal)")
+            continue
+        yield item
+
+# https://github.com/gbstack/ffprobe-python
+def filterbyexcludecodec(items, not_codecs, minbpp=MIN_BPP):
+    for item in items:
+        item.action, reason = getaction(probeitem(item), not_codecs, minbpp)
+        print(f"{item.action}: {item.input} ({reason})")
+        if item.action == 'skip':
+            continue
+        yield item
+
+# skip, remux (stream copy) or encode, from the first video stream
+def getaction(probe, not_codecs, minbpp=MIN_BPP):
+    if not probe.codec:
+        return 'skip', "no video stream"
+    name = probe.codec.lower()
+    if name in not_codecs:
+        return 'remux', name
+    bpp = bitsperpixel(probe)
+    if bpp is None:
+        return 'encode', name
+    if bpp < minbpp:
+        return 'skip', f"{name}, {bpp:.3f} bpp < {minbpp}"
+    return 'encode', f"{name}, {bpp:.3f} bpp"
+
+def bitsperpixel(probe):
+    if not probe.videobitrate or not probe.width or not probe.height or not probe.fps:
+        return None
+    return probe.videobitrate / (probe.width * probe.height * probe.fps)
+
+def setoutputcodec(item, suffix):
+    item.output = replacesuffix(item.output, suffix)
+
+def createtemp(item, scratch=SCRATCH):
+    folderpath = temppath(item.input, scratch)
+    item.temp = folderpath
+    if exists(folderpath) :
+        return
+    os.makedirs(folderpath)
+    print(f"Directory {folderpath} created")
+
+# <input>_temp, or <name>-<path hash>_temp in the scratch folder (same names in different folders)
+def temppath(input, scratch=SCRATCH):
+    if not scratch:
+        return f"{input}_temp"
+    digest = hashlib.blake2b(os.path.abspath(input).encode(), digest_size=4).hexdigest()
+    return os.path.join(scratch, f"{os.path.basename(input)}-{digest}_temp")
+
+def removetemp(item):
+    if exists(item.temp):
+        shutil.rmtree(item.temp, ignore_errors=True)
+        print(f"Directory {item.temp} removed")
+
+# one keyframe-only decode: the most representative bright keyframe, and the optional contact sheet and strip
+def savethumb(item, sheet=THUMB_SHEET, strip=THUMB_STRIP):
+    input = item.input
+    filepath = os.path.join(item.temp, "thumb.jpg")
+    overwrite = ['-y']
+    verbose = ['-hide_banner', '-loglevel', 'error']
+    duration = getduration(item)
+    cmd = [FFMPEG, *overwrite, *verbose, '-skip_frame', 'nokey', '-i', input, '-filter_complex', thumbfilter(duration, sheet, strip),
+        '-map', '[thumb]', '-frames:v', '1', '-q:v', '2', filepath, *sheetoutputs(input, sheet, strip)]
+    # failed or timed out (long 4K clips with --sheet or --strip): the outputs are encoded without a cover
+    try:
+        runcmd(cmd, 'thumb')
+    except subprocess.SubprocessError as error:
+        print(f"Keyframe thumbnail failed ({error.__class__.__name__}): {input}")
+    if not filesize(filepath):
+        # all keyframes dark, or a clip too short: first frame
+        cmd = [FFMPEG, *overwrite, *verbose, '-i', input, '-frames:v', '1', '-q:v', '2', filepath]
+        try:
+            runcmd(cmd, 'thumb')
+        except subprocess.SubprocessError as error:
+            print(f"Thumbnail failed ({error.__class__.__name__}), no cover: {input}")
+    if filesize(filepath):
+        item.thumb = filepath
+
+# contact sheet and strip alone, once the direct pass is done with the cover
+def savesheets(item, sheet=THUMB_SHEET, strip=THUMB_STRIP):
+    input = item.input
+    overwrite = ['-y']
+    verbose = ['-hide_banner', '-loglevel', 'error']
+    duration = getduration(item)
+    cmd = [FFMPEG, *overwrite, *verbose, '-skip_frame', 'nokey', '-i', input, '-filter_complex', thumbfilter(duration, sheet, strip, thumb=False),
+        *sheetoutputs(input, sheet, strip)]
+    try:
+        runcmd(cmd, 'thumb')
+    except subprocess.SubprocessError as error:
+        print(f"Sheet and strip failed ({error.__class__.__name__}): {input}")
+
+def sheetoutputs(input, sheet=THUMB_SHEET, strip=THUMB_STRIP):
+    cmdsheet = ['-map', '[sheet]', '-frames:v', '1', '-q:v', '3', replacesuffix(input, f"-sheet{THUMB_SUFFIX}")] if sheet else []
+    cmdstrip = ['-map', '[strip]', '-frames:v', '1', '-q:v', '3', replacesuffix(input, f"-strip{THUMB_SUFFIX}")] if strip else []
+    return cmdsheet + cmdstrip
+
+# thumbnail filter over keyframes brighter than THUMB_MIN_LUMA, sheet and strip from evenly spread keyframes
+def thumbfilter(duration, sheet=THUMB_SHEET, strip=THUMB_STRIP, thumb=True):
+    outputs = (['thumb'] if thumb else []) + (['sheet'] if sheet else []) + (['strip'] if strip else [])
+    graph = [f"[0:v]split={len(outputs)}" + "".join(f"[{name}in]" for name in outputs)]
+    if thumb:
+        graph.append(f"[thumbin]signalstats,metadata=select:key=lavfi.signalstats.YAVG:value={THUMB_MIN_LUMA}:function=greater,thumbnail={THUMB_CANDIDATES}[thumb]")
+    if sheet:
+        columns, rows = THUMB_SHEET_GRID
+        graph.append(f"[sheetin]{spreadframes(duration, columns * rows)},scale={THUMB_SHEET_WIDTH}:-2,tile={columns}x{rows}[sheet]")
+    if strip:
+        graph.append(f"[stripin]{spreadframes(duration, THUMB_STRIP_FRAMES)},scale={THUMB_STRIP_WIDTH}:-2,tile={THUMB_STRIP_FRAMES}x1[strip]")
+    return ";".join(graph)
+
+def spreadframes(duration, count):
+    interval = duration / count if duration else 0
+    return f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.3f})'"
+
+# cover tagged on an output encoded before its thumbnail was ready
+def addcover(item):
+    cmd = [MP4BOX, '-itags', f"cover={item.thumb}", item.output]
+    runcmd(cmd, 'mux')
+
+def savevideo(item, threads=0):
+    if probeitem(item).video < 0:
+        return
+    filepath = os.path.join(item.temp, "video.h265")
+    overwrite = ['-y']
+    verbose = ['-hide_banner', '-loglevel', 'error']
+    cmdcodec = videocodec(item, threads, annexb=True)
+    cmdprogress = ['-progress', 'pipe:1', '-nostats']
+    cmd = [FFMPEG, *overwrite, *verbose, *cmdprogress, '-i', item.input, '-map', '0:v:0', *cmdcodec, filepath]
+    out = runcmd(cmd, 'video', progress=progresscallback(item))
+    item.video = filepath
+
+# cut at keyframes, encode the segments in parallel and concatenate the HEVC bitstreams
+def savevideosplit(item, threads, segments):
+    filepath = os.path.join(item.temp, "video.h265")
+    splitdir = os.path.join(item.temp, "split")
+    shutil.rmtree(splitdir, ignore_errors=True)
+    os.makedirs(splitdir)
+    duration = getduration(item)
+    times = ",".join(f"{duration * index / segments:.3f}" for index in range(1, segments))
+    pattern = os.path.join(splitdir, "part%03d.mp4")
+    verbose = ['-hide_banner', '-loglevel', 'error']
+    cmd = [FFMPEG, '-y', *verbose, '-i', item.input, '-map', '0:v:0', '-c', 'copy', '-f', 'segment', '-segment_times', times, '-reset_timestamps', '1', pattern]
+    runcmd(cmd, 'split')
+    parts = sorted(glob.glob(os.path.join(splitdir, "part*.mp4")))
+    print(f"Split {item.input}: {len(parts)} segments")
+    partthreads = max(1, threads // len(parts)) if threads else 0
+    with ThreadPoolExecutor(max_workers=len(parts)) as pool:
+        encoded = list(pool.map(lambda part: savevideopart(item, part, partthreads), parts))
+    # annex b streams concatenate losslessly: each part starts with VPS/SPS/PPS and an IDR frame
+    with open(filepath, 'wb') as output:
+        for part in encoded:
+            with open(part, 'rb') as file:
+                shutil.copyfileobj(file, output, 1024 * 1024)
+    expected = countframes(item.input, probeitem(item))
+    actual = countframes(filepath)
+    shutil.rmtree(splitdir, ignore_errors=True)
+    # frames and duration: a header frame count can be wrong, a segment lost or doubled shows in the duration
+    fps = probeitem(item).fps
+    seconds = actual / fps if fps else duration
+    if expected != actual or abs(seconds - duration) > SPLIT_TOLERANCE:
+        print(f"Split check failed ({actual} frames, {expected} expected, {seconds:.2f}s / {duration:.2f}s), encoding in one pass: {item.input}")
+        os.remove(filepath)
+        savevideo(item, threads)
+        return
+    print(f"Split check: {actual} frames, {seconds:.2f}s / {duration:.2f}s")
+    item.video = filepath
+
+def savevideopart(item, part, threads):
+    filepath = replacesuffix(part, ".h265")
+    cmdcodec = videocodec(item, threads)
+    cmd = [FFMPEG, '-y', '-hide_banner', '-loglevel', 'error', '-progress', 'pipe:1', '-nostats', '-i', part, *cmdcodec, filepath]
+    runcmd(cmd, 'video', progress=progresscallback(item, os.path.basename(part)))
+    return filepath
+
+# frames of the first video stream, from the probe when known else by counting packets
+def countframes(path, probe=None):
+    if probe is not None and probe.frames:
+        return probe.frames
+    cmd = [FFPROBE, '-v', 'error', '-count_packets', '-select_streams', 'v:0', '-show_entries', 'stream=nb_read_packets', '-of', 'csv=p=0', path]
+    out = runcmd(cmd, 'count').stdout
+    return int(out.decode().strip().split(',')[0] or 0)
+
+def getduration(item):
+    return probeitem(item).duration
+
+def saveaudio(item):
+    if probeitem(item).audio < 0:
+        return
+    filepath = os.path.join(item.temp, "audio.m4a")
+    cmd = [MP4BOX, '-single', '2', '-out', filepath, item.input]
+    out = runcmd(cmd, 'audio')
+    item.audio = filepath
+
+# encode video, copy audio and attach thumbnail as cover in a single ffmpeg pass
+def savedirect(item, threads=0, thumb=None):
+    hasthumb = item.thumb and exists(item.thumb)
+    overwrite = ['-y']
+    verbose = ['-hide_banner', '-loglevel', 'error']
+    cmdcodec = videocodec(item, threads)
+    cmdthumb = ['-i', item.thumb] if hasthumb else []
+    cmdmap = ['-map', '0:v:0', '-map', '0:a:0?'] + (['-map', '1:v:0'] if hasthumb else [])
+    cmdcover = ['-c:v:1', 'mjpeg', '-disposition:v:1', 'attached_pic'] if hasthumb else []
+    cmdprogress = ['-progress', 'pipe:1', '-nostats']
+    cmd = [FFMPEG, *overwrite, *verbose, *cmdprogress, '-i', item.input, *cmdthumb, *cmdmap, *cmdcodec, '-tag:v:0', 'hvc1', '-c:a', 'copy', *cmdcover, item.output]
+    out = runcmd(cmd, 'video', progress=progresscallback(item))
+    if thumb is not None and not hasthumb:
+        # cover later than THUMB_WAIT: the encoded output is kept, no cover is not worth a second encode
+        try:
+            thumb.result()
+            if item.thumb and exists(item.thumb):
+                addcover(item)
+        except subprocess.SubprocessError as error:
+            print(f"Cover not attached ({error.__class__.__name__}): {item.output}")
+
+# raw .h265 needs annex b start codes when copied out of mp4
+def videocodec(item, threads=0, annexb=False):
+    if item.action == 'remux':
+        return ['-c:v', 'copy', '-bsf:v', 'hevc_mp4toannexb'] if annexb else ['-c:v', 'copy']
+    cmdtune = ['-preset', item.preset, '-crf', str(item.crf)] if item.preset else []
+    return ['-c:v', 'libx265', *cmdtune, *x265params(threads)]
+
+def writtenbytes(item):
+    files = [item.thumb, item.video, item.audio, item.output, *(item.proxies or [])]
+    return sum(os.path.getsize(file) for file in files if file and exists(file))
+
+def getthreadsperjob(cores, jobs, threadsperjob):
+    if threadsperjob > 0:
+        return threadsperjob
+    return max(1, cores // jobs)
+
+# https://x265.readthedocs.io/en/master/cli.html#performance-options
+def x265params(threads):
+    if threads <= 0:
+        return []
+    frames = 1
+    for mincores, count in [(32, 6), (16, 5), (8, 3), (4, 2)]:
+        if threads >= mincores:
+            frames = count
+            break
+    return ['-x265-params', f"pools={threads}:frame-threads={frames}"]
+
+def reencode(item, video=None, output=None):
+    video = video or item.video
+    output = output or item.output
+    cmdvideo = ['-add', f"{video}#video:name="] if video else []
+    cmdaudio = ['-add', f"{item.audio}#audio:name="] if item.audio else []
+    cmdthumb = ['-itags', f"cover={item.thumb}"] if item.thumb else []
+    cmd = [MP4BOX, *cmdvideo, *cmdaudio, *cmdthumb, '-new', output]
+    out = runcmd(cmd, 'mux')
+
+# LADDER *********************************************************************
+
+# "<suffix>:<height>[:<crf>]" list, e.g. "-proxy720.mp4:720:28,-proxy480.mp4:480"
+def parseladder(arg):
+    rungs = []
+    for spec in splitpatterns(arg):
+        suffix, height, *crf = spec.split(':')
+        rungs.append({ 'suffix':suffix, 'height':int(height), 'crf':int(crf[0]) if crf else LADDER_CRF })
+    return rungs
+
+# rungs under the source height (no upscale), encoded items only
+def ladderrungs(item, ladder):
+    if item.action != 'encode':
+        return []
+    height = probeitem(item).height
+    return [rung for rung in ladder if rung['height'] < height]
+
+def rungvideo(item, rung):
+    return os.path.join(item.temp, f"video{rung['height']}.h265")
+
+def rungoutput(item, rung):
+    return replacesuffix(item.input, rung['suffix'])
+
+# one decode split into the archive encode and the scaled proxies, each written as a raw stream
+def savevideoladder(item, threads, rungs):
+    filepath = os.path.join(item.temp, "video.h265")
+    height = probeitem(item).height
+    labels = "".join(f"[v{index}]" for index in range(len(rungs) + 1))
+    graph = [f"[0:v:0]split={len(rungs) + 1}{labels}"]
+    # threads shared by pixels: a 720p proxy of a 4K source takes 1/9 of the pool, the archive the rest
+    shares = [max(1, int(threads * (rung['height'] / height) ** 2)) if threads else 0 for rung in rungs]
+    archive = max(1, threads - sum(shares)) if threads else 0
+    cmdoutputs = ['-map', '[v0]', *videocodec(item, archive), filepath]
+    for index, (rung, share) in enumerate(zip(rungs, shares), 1):
+        graph.append(f"[v{index}]scale=-2:{rung['height']}[r{index}]")
+        cmdcodec = ['-c:v', 'libx265', '-preset', LADDER_PRESET, '-crf', str(rung['crf']), *x265params(share)]
+        cmdoutputs += ['-map', f"[r{index}]", *cmdcodec, rungvideo(item, rung)]
+    overwrite = ['-y']
+    verbose = ['-hide_banner', '-loglevel', 'error']
+    cmdprogress = ['-progress', 'pipe:1', '-nostats']
+    cmd = [FFMPEG, *overwrite, *verbose, *cmdprogress, '-i', item.input, '-filter_complex', ";".join(graph), *cmdoutputs]
+    runcmd(cmd, 'video', progress=progresscallback(item))
+    item.video = filepath
+
+# each proxy muxed with the audio and cover of the archive
+def muxladder(item, rungs):
+    item.proxies = []
+    for rung in rungs:
+        video = rungvideo(item, rung)
+        output = rungoutput(item, rung)
+        if not exists(video):
+            print(f"Proxy video missing, not muxed: {output}")
+            continue
+        resumestage(item, f"muxed{rung['suffix']}", output, reencode, item, video, output)
+        item.proxies.append(output)
+
+# TUNE *********************************************************************
+
+# encode short samples with each candidate, fastest preset first, and keep the first reaching the target
+def tuneitem(item, tune, target, threads=0):
+    probe = probeitem(item)
+    key = tunekey(probe, tune, target)
+    with TUNE_LOCK:
+        cached = TUNE_CACHE.get(key)
+    if cached is not None:
+        item.preset, item.crf = cached['preset'], cached['crf']
+        print(f"Tune (cache {key}): preset {item.preset}, crf {item.crf}")
+        return
+    tunedir = os.path.join(item.temp, "tune")
+    os.makedirs(tunedir, exist_ok=True)
+    samples = savesamples(item, probe, tunedir)
+    if not samples:
+        print(f"Tune skipped (no sample): {item.input}")
+        return
+    inputrate = probe.bitrate / 8
+    choice = None
+    for preset in TUNE_PRESETS:
+        for crf in tunecrfs(tune):
+            value, seconds = trysetting(samples, tunedir, preset, crf, tune, inputrate, threads)
+            print(f"Tune {preset} crf {crf}: {tune} {value:.3f} ({seconds:.1f}s)")
+            if reachestarget(tune, value, target):
+                choice = { 'preset':preset, 'crf':crf, 'value':value, 'seconds':seconds }
+                break
+        if choice is not None:
+            break
+    if choice is None:
+        choice = { 'preset':TUNE_PRESETS[-1], 'crf':tunecrfs(tune)[-1], 'value':None, 'seconds':None }
+        print(f"Tune target {tune} {target} not reached, using the slowest setting")
+    shutil.rmtree(tunedir, ignore_errors=True)
+    with TUNE_LOCK:
+        TUNE_CACHE[key] = choice
+    item.preset, item.crf = choice['preset'], choice['crf']
+    print(f"Tune ({key}): preset {item.preset}, crf {item.crf}")
+
+# quality targets: the smallest output reaching it, size target: the best quality under it
+def tunecrfs(tune):
+    return TUNE_CRFS[::-1] if tune == 'size' else TUNE_CRFS
+
+# one choice per camera model and resolution
+def tunekey(probe, tune, target):
+    return f"{probe.model}|{probe.width}x{probe.height}|{tune}|{target}"
+
+# lossless references spread over the clip
+def savesamples(item, probe, tunedir):
+    duration = probe.duration
+    length = min(TUNE_SAMPLE_SECONDS, duration)
+    samples = []
+    for index in range(TUNE_SAMPLES):
+        ts = max(0, duration * (index + 1) / (TUNE_SAMPLES + 1) - length / 2)
+        filepath = os.path.join(tunedir, f"sample{index}.mkv")
+        cmd = [FFMPEG, '-y', '-hide_banner', '-loglevel', 'error', '-ss', f"{ts:.3f}", '-i', item.input, '-t', f"{length:.3f}", '-map', '0:v:0', '-c:v', 'ffv1', filepath]
+        runcmd(cmd, 'sample')
+        if exists(filepath):
+            samples.append((filepath, length))
+    return samples
+
+# mean quality (or size ratio) over the samples and encoding time
+def trysetting(samples, tunedir, preset, crf, tune, inputrate, threads=0):
+    values = []
+    seconds = 0.0
+    for sample, length in samples:
+        filepath = os.path.join(tunedir, f"{preset}-{crf}.mp4")
+        start = time.perf_counter()
+        cmd = [FFMPEG, '-y', '-hide_banner', '-loglevel', 'error', '-i', sample, '-c:v', 'libx265', '-preset', preset, '-crf', str(crf), *x265params(threads), filepath]
+        runcmd(cmd, 'video')
+        seconds += time.perf_counter() - start
+        if tune == 'size':
+            rate = os.path.getsize(filepath) / length
+            values.append(rate / inputrate if inputrate else 1.0)
+        else:
+            values.append(getquality(filepath, sample, tune))
+    return sum(values) / len(values), seconds
+
+def getquality(distorted, reference, tune):
+    lavfi = f"[0:v][1:v]{QUALITY_FILTERS[tune]}"
+    cmd = [FFMPEG, '-hide_banner', '-nostats', '-i', distorted, '-i', reference, '-lavfi', lavfi, '-f', 'null', '-']
+    # scores are printed on stderr: collected, not streamed
+    out = runcmd(cmd, 'quality', echo=False)
+    found = re.findall(QUALITY_REGS[tune], out.stderr.decode(errors='replace'))
+    if not found:
+        return 0.0
+    return float(found[-1])
+
+def reachestarget(tune, value, target):
+    if tune == 'size':
+        return value <= target
+    return value >= target
+
+def loadtune(dirpath):
+    filepath = os.path.join(dirpath, TUNE_FILE)
+    with TUNE_LOCK:
+        TUNE_CACHE.clear()
+    if not exists(filepath):
+        return
+    try:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        print(f"Tune cache {filepath} ignored (unreadable)")
+        return
+    with TUNE_LOCK:
+        TUNE_CACHE.update(data)
+
+def savetune(dirpath):
+    with TUNE_LOCK:
+        data = dict(TUNE_CACHE)
+    if not data:
+        return
+    filepath = os.path.join(dirpath, TUNE_FILE)
+    tmppath = f"{filepath}.tmp"
+    with open(tmppath, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
+    os.replace(tmppath, filepath)
+
+# DEDUP *********************************************************************
+
+def findduplicate(item, firsts, fullhash=DEDUP_FULLHASH):
+    item.fingerprint = fingerprint(item.input, fullhash)
+    first = firsts.get(item.fingerprint)
+    if first is not None:
+        item.duplicate = first.output
+        print(f"Duplicate of {first.input}: {item.input}")
+        return True
+    firsts[item.fingerprint] = item
+    output = DEDUP_INDEX.get(item.fingerprint)
+    if output and exists(output) and output != os.path.abspath(item.output):
+        item.duplicate = output
+        print(f"Duplicate of {output}: {item.input}")
+        return True
+    return False
+
+# size, head, middle and tail blocks (and optionally the whole file)
+def fingerprint(filepath, fullhash=DEDUP_FULLHASH):
+    size = os.path.getsize(filepath)
+    blake = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(filepath, 'rb') as file:
+        for offset in [0, max(0, size // 2 - DEDUP_BLOCK // 2), max(0, size - DEDUP_BLOCK)]:
+            file.seek(offset)
+            blake.update(file.read(DEDUP_BLOCK))
+    value = f"{size}-{blake.hexdigest()}"
+    if fullhash:
+        value = f"{value}-{checksum(filepath)}"
+    return value
+
+def linkduplicate(item, dedup):
+    if exists(item.output):
+        print(f"Duplicate already linked: {item.output}")
+        item.mode = 'linked'
+        return
+    if dedup == 'skip' or not exists(item.duplicate):
+        print(f"Duplicate skipped: {item.input}")
+        item.mode = 'skipped'
+        return
+    try:
+        os.link(item.duplicate, item.output)
+        print(f"Duplicate linked: {item.output} -> {item.duplicate}")
+        item.mode = 'linked'
+    except OSError as error:
+        print(f"Duplicate skipped ({error}): {item.input}")
+        item.mode = 'skipped'
+
+def loaddedup(dirpath):
+    filepath = os.path.join(dirpath, DEDUP_FILE)
+    DEDUP_INDEX.clear()
+    if not exists(filepath):
+        return
+    try:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            DEDUP_INDEX.update(json.load(file))
+    except (OSError, ValueError):
+        print(f"Dedup index {filepath} ignored (unreadable)")
+
+def savededup(dirpath, items):
+    for item in items:
+        if item.fingerprint and not item.duplicate and exists(item.output):
+            DEDUP_INDEX[item.fingerprint] = os.path.abspath(item.output)
+    data = { key: output for key, output in DEDUP_INDEX.items() if exists(output) }
+    filepath = os.path.join(dirpath, DEDUP_FILE)
+    tmppath = f"{filepath}.tmp"
+    with open(tmppath, 'w', encoding='utf-8') as file:
+        json.dump(data, file)
+    os.replace(tmppath, filepath)
+
+# SCRATCH *********************************************************************
+
+# intermediates of an item: thumb only in direct mode, raw video and audio in temp mode, segments too when split,
+# the proxy streams by pixels too with a ladder (always in temp mode), and the tune samples
+def scratchneed(item, mode, splitting, rungs=None, tune=TUNE, tunetarget=None):
+    size = filesize(item.input)
+    samples = tuneneed(item, tune, tunetarget)
+    if splitting:
+        return size * 2 + samples
+    if rungs:
+        height = probeitem(item).height
+        return size + sum(int(size * (rung['height'] / height) ** 2) for rung in rungs) + samples
+    if mode == 'direct':
+        return min(size, 16 * 1024 * 1024) + samples
+    return size + samples
+
+# lossless samples written by tuneitem, none once the setting of the camera model is cached
+def tuneneed(item, tune, target):
+    if tune == 'off' or item.action != 'encode':
+        return 0
+    probe = probeitem(item)
+    with TUNE_LOCK:
+        if tunekey(probe, tune, target) in TUNE_CACHE:
+            return 0
+    length = min(TUNE_SAMPLE_SECONDS, probe.duration)
+    raw = probe.width * probe.height * 1.5 * (probe.fps or 30) * length
+    return int(TUNE_SAMPLES * raw * TUNE_SAMPLE_RATIO)
+
+# wait until the item fits in the quota and in the free space of the scratch volume
+def reservescratch(item, scratch, need, quota=SCRATCH_QUOTA):
+    global SCRATCH_USED
+    dirpath = scratch or os.path.dirname(os.path.abspath(item.input))
+    os.makedirs(dirpath, exist_ok=True)
+    waiting = False
+    with SCRATCH_CONDITION:
+        while True:
+            used = SCRATCH_USED
+            free = shutil.disk_usage(dirpath).free - used
+            fitsquota = not quota or used + need <= quota
+            fitsfree = free - need >= SCRATCH_FREE
+            if used == 0 and not fitsfree:
+                print(f"Not enough space in {dirpath} for {need} bytes of intermediates, skipped: {item.input}")
+                return False
+            # a single item over the quota runs alone
+            if (fitsquota or used == 0) and fitsfree:
+                SCRATCH_USED += need
+                return True
+            if not waiting:
+                print(f"Waiting for scratch space ({need} bytes, {used} in use): {item.input}")
+                waiting = True
+            SCRATCH_CONDITION.wait(SCRATCH_WAIT)
+
+def releasescratch(need):
+    global SCRATCH_USED
+    with SCRATCH_CONDITION:
+        SCRATCH_USED -= need
+        SCRATCH_CONDITION.notify_all()
+
+# PLAN *********************************************************************
+
+# predicted time and space saved of each item, ordered by the policy, printed before the first encode
+def planitems(items, order, jobs, deadline=DEADLINE):
+    speed, bpp, runs = calibrate()
+    costs = { item.input: plancost(item, speed, bpp) for item in items }
+    budget = parsedeadline(deadline) if order == 'deadline' else None
+    if order == 'shortest':
+        items.sort(key=lambda item: costs[item.input][0])
+    elif order == 'longest':
+        # longest first: the short files fill the jobs at the end of the batch
+        items.sort(key=lambda item: costs[item.input][0], reverse=True)
+    elif order == 'deadline':
+        items = deadlineorder(items, costs, jobs, budget)
+    ends = simulatejobs([costs[item.input][0] for item in items], jobs)
+    logplan(items, costs, ends, jobs, budget, speed, bpp, runs)
+    return items
+
+# seconds and bytes saved, from the pixels to encode and the calibrated speed and output bits per pixel
+def plancost(item, speed, bpp):
+    probe = probeitem(item)
+    if item.action == 'remux':
+        return probe.duration / PLAN_REMUX_SPEED, 0
+    pixels = itempixels(probe)
+    return pixels / speed, max(0, filesize(item.input) - pixels * bpp / 8)
+
+def itempixels(probe):
+    frames = probe.frames or probe.duration * probe.fps
+    return int(probe.width * probe.height * frames)
+
+# median speed of one job and output bits per pixel over the last encodes of the report
+# speed from the wall time of the encode stage (video or direct): the item time includes scratch, adaptive and tune waits
+def calibrate():
+    records = readreport()
+    items = { (record['run'], record['input']): record for record in records
+        if record['stage'] == 'item' and record.get('pixels') and record['output_bytes'] }
+    encodes = {}
+    for record in records:
+        key = (record['run'], record['input'])
+        if record['stage'] in ['video', 'direct'] and key in items:
+            encodes[key] = record['wall']
+    samples = [(items[key], wall) for key, wall in encodes.items() if wall > 0][-PLAN_HISTORY:]
+    if not samples:
+        return PLAN_SPEED, PLAN_OUTPUT_BPP, 0
+    speed = statistics.median(item['pixels'] / wall for item, wall in samples)
+    bpp = statistics.median(item['output_bytes'] * 8 / item['pixels'] for item, wall in samples)
+    return speed, bpp, len(samples)
+
+# most bytes saved per second first while the jobs end before the deadline, the others after it (shortest first)
+def deadlineorder(items, costs, jobs, budget):
+    ranked = sorted(items, key=lambda item: costs[item.input][1] / max(costs[item.input][0], 1), reverse=True)
+    if budget is None:
+        return ranked
+    workers = [0.0] * max(jobs, 1)
+    before = []
+    after = []
+    for item in ranked:
+        seconds = costs[item.input][0]
+        if workers[0] + seconds <= budget:
+            heapq.heapreplace(workers, workers[0] + seconds)
+            before.append(item)
+        else:
+            after.append(item)
+    return before + sorted(after, key=lambda item: costs[item.input][0])
+
+# end of each item when the queue is taken in order by the first free job
+def simulatejobs(costs, jobs):
+    workers = [0.0] * max(jobs, 1)
+    ends = []
+    for seconds in costs:
+        end = workers[0] + seconds
+        heapq.heapreplace(workers, end)
+        ends.append(end)
+    return ends
+
+# seconds from now: a number of seconds, or a HH:MM local time (tomorrow when already past)
+def parsedeadline(deadline):
+    if not deadline:
+        return None
+    if ':' not in deadline:
+        return float(deadline)
+    now = datetime.now()
+    hour, minute = (int(part) for part in deadline.split(':'))
+    end = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if end <= now:
+        end += timedelta(days=1)
+    return (end - now).total_seconds()
+
+# CONTROL *********************************************************************
+
+# sample the system and move the limit of running encodes until the returned event is set, None without /proc (Windows)
+def startcontrol(jobs, cores):
+    if readsystem(cores) is None:
+        print("Adaptive jobs off (no /proc): fixed jobs")
+        return None
+    with CONTROL_CONDITION:
+        CONTROL_STATE.clear()
+        CONTROL_STATE.update({ 'enabled': True, 'limit': 1, 'max': jobs, 'running': 0, 'sample': readsystem(cores), 'fresh': True, 'changed': time.monotonic() })
+    stop = threading.Event()
+    def sample():
+        while not stop.wait(CONTROL_SECONDS):
+            system = readsystem(cores)
+            with CONTROL_CONDITION:
+                limit, reason = controllimit(system, CONTROL_STATE)
+                if limit != CONTROL_STATE['limit']:
+                    print(f"Control: {CONTROL_STATE['limit']} -> {limit} encodes ({reason}, {CONTROL_STATE['running']} running, {logsystem(system)})")
+                    CONTROL_STATE['limit'] = limit
+                    CONTROL_STATE['changed'] = time.monotonic()
+                CONTROL_STATE['sample'] = system
+                CONTROL_STATE['fresh'] = True
+                CONTROL_CONDITION.notify_all()
+        with CONTROL_CONDITION:
+            CONTROL_STATE['enabled'] = False
+            CONTROL_CONDITION.notify_all()
+    threading.Thread(target=sample, daemon=True).start()
+    return stop
+
+# one less on memory or io pressure, one more when the cpu is not saturated and the running encodes use the limit
+def controllimit(system, state):
+    limit = state['limit']
+    pressure = system['pressure']
+    if system['memory'] < CONTROL_FREE_MEMORY or pressure['memory'] > CONTROL_PRESSURE['memory']:
+        return max(1, limit - 1), "memory"
+    if pressure['io'] > CONTROL_PRESSURE['io']:
+        return max(1, limit - 1), "io stalls"
+    if limit >= state['max'] or state['running'] < limit:
+        return limit, ""
+    if time.monotonic() - state['changed'] < CONTROL_SETTLE:
+        return limit, ""
+    if system['load'] / system['cores'] < CONTROL_LOAD and pressure['cpu'] < CONTROL_PRESSURE['cpu']:
+        return limit + 1, "cpu not saturated"
+    return limit, ""
+
+# wait for a free encode under the limit and memory for this resolution, the first encode always starts
+def acquirejob(item):
+    waiting = False
+    with CONTROL_CONDITION:
+        while CONTROL_STATE['enabled'] and CONTROL_STATE['running'] > 0:
+            need = jobmemory(item)
+            available = CONTROL_STATE['sample']['memory'] - CONTROL_FREE_MEMORY
+            if CONTROL_STATE['running'] < CONTROL_STATE['limit'] and CONTROL_STATE['fresh'] and need <= available:
+                break
+            if not waiting:
+                print(f"Control: hold ({CONTROL_STATE['running']}/{CONTROL_STATE['limit']} encodes, needs {need / 1024 ** 3:.1f} GB, {max(0, available) / 1024 ** 3:.1f} GB available): {item.input}")
+                waiting = True
+            CONTROL_CONDITION.wait(CONTROL_SECONDS)
+        CONTROL_STATE['running'] = CONTROL_STATE.get('running', 0) + 1
+        # memory and load of this encode are seen by the next sample
+        CONTROL_STATE['fresh'] = False
+
+def releasejob():
+    with CONTROL_CONDITION:
+        CONTROL_STATE['running'] -= 1
+        CONTROL_CONDITION.notify_all()
+
+def jobmemory(item):
+    probe = probeitem(item)
+    return probe.width * probe.height * CONTROL_JOB_MEMORY
+
+# load average, available memory and pressure stall (PSI) averages, None without /proc
+def readsystem(cores):
+    try:
+        with open('/proc/loadavg', 'r') as file:
+            load = float(file.read().split()[0])
+        memory = 0
+        with open('/proc/meminfo', 'r') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    memory = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        return None
+    pressure = { resource: readpressure(resource) for resource in CONTROL_PRESSURE }
+    return { 'load': load, 'cores': cores, 'memory': memory, 'pressure': pressure }
+
+# "some avg10=1.23 avg60=... total=..." line, 0 without PSI (kernel < 4.20 or psi=0)
+def readpressure(resource):
+    try:
+        with open(f"/proc/pressure/{resource}", 'r') as file:
+            for line in file:
+                kind, *fields = line.split()
+                if kind == 'some':
+                    return float(dict(field.split('=') for field in fields)['avg10'])
+    except (OSError, ValueError, KeyError):
+        pass
+    return 0.0
+
+# PROGRESS *********************************************************************
+
+# print the progress of running encodes and the batch ETA until the returned event is set
+def startprogress(metricspath=None):
+    with PROGRESS_LOCK:
+        PROGRESS.clear()
+        PROGRESS_BATCH.clear()
+        PROGRESS_BATCH.update({ 'start': time.monotonic(), 'files': 0, 'finished': 0, 'total': 0.0, 'done': 0.0 })
+    stop = threading.Event()
+    def tick():
+        while not stop.wait(PROGRESS_SECONDS):
+            snapshot = progresssnapshot()
+            logprogress(snapshot)
+            if metricspath:
+                savemetrics(metricspath, snapshot)
+        if metricspath:
+            savemetrics(metricspath, progresssnapshot())
+    threading.Thread(target=tick, daemon=True).start()
+    return stop
+
+# media seconds to encode, known from the probe
+def queueprogress(item):
+    duration = getduration(item)
+    with PROGRESS_LOCK:
+        PROGRESS[item.input] = { 'duration': duration, 'start': None, 'updated': None, 'parts': {} }
+        PROGRESS_BATCH['files'] += 1
+        PROGRESS_BATCH['total'] += duration
+
+def endprogress(item):
+    with PROGRESS_LOCK:
+        entry = PROGRESS.pop(item.input, None)
+        if entry is None:
+            return
+        PROGRESS_BATCH['finished'] += 1
+        PROGRESS_BATCH['done'] += entry['duration']
+
+# called on the runner thread for each -progress block (one part per split segment)
+def progresscallback(item, part=""):
+    def update(block):
+        now = time.monotonic()
+        with PROGRESS_LOCK:
+            entry = PROGRESS.get(item.input)
+            if entry is None:
+                return
+            entry['start'] = entry['start'] or now
+            entry['updated'] = now
+            entry['parts'][part] = {
+                'time': int(block.get('out_time_us') or block.get('out_time_ms') or 0) / 1000000,
+                'fps': parsefloat(block.get('fps')),
+                'speed': parsefloat(block.get('speed', '').rstrip('x')),
+                'bitrate': parsefloat(block.get('bitrate', '').replace('kbits/s', '')) }
+    return update
+
+def progresssnapshot():
+    now = time.monotonic()
+    files = []
+    with PROGRESS_LOCK:
+        batch = dict(PROGRESS_BATCH)
+        entries = { input: dict(entry, parts=list(entry['parts'].values())) for input, entry in PROGRESS.items() }
+    running = 0.0
+    for input, entry in entries.items():
+        if entry['start'] is None:
+            continue
+        parts = entry['parts']
+        encoded = min(entry['duration'] or float('inf'), sum(part['time'] for part in parts))
+        speed = sum(part['speed'] for part in parts)
+        if not speed and now > entry['start']:
+            speed = encoded / (now - entry['start'])
+        remaining = max(0.0, entry['duration'] - encoded)
+        running += encoded
+        files.append({
+            'input': os.path.abspath(input),
+            'progress': encoded / entry['duration'] if entry['duration'] else 0.0,
+            'fps': sum(part['fps'] for part in parts),
+            'speed': speed,
+            'bitrate': sum(part['bitrate'] for part in parts) / len(parts) if parts else 0.0,
+            'eta': remaining / speed if speed else None,
+            'stalled': now - entry['updated'] > PROGRESS_STALL })
+    elapsed = now - batch.get('start', now)
+    encoded = batch.get('done', 0.0) + running
+    total = batch.get('total', 0.0)
+    speed = encoded / elapsed if elapsed > 0 else 0.0
+    batch = {
+        'files': batch.get('files', 0),
+        'finished': batch.get('finished', 0),
+        'progress': encoded / total if total else 0.0,
+        'fps': sum(file['fps'] for file in files),
+        'speed': speed,
+        'elapsed': elapsed,
+        'eta': max(0.0, total - encoded) / speed if speed else None }
+    return { 'batch': batch, 'files': files }
+
+# .prom : Prometheus textfile (node_exporter textfile collector), else JSON
+def savemetrics(filepath, snapshot):
+    if filepath.endswith('.prom'):
+        data = prometheusmetrics(snapshot)
+    else:
+        data = json.dumps(dict(snapshot, time=datetime.now(timezone.utc).isoformat()), indent=2)
+    tmppath = f"{filepath}.tmp"
+    try:
+        with open(tmppath, 'w', encoding='utf-8') as file:
+            file.write(data)
+        os.replace(tmppath, filepath)
+    except OSError as error:
+        print(f"Metrics not written to {filepath}: {error}")
+
+def prometheusmetrics(snapshot):
+    batch = snapshot['batch']
+    lines = []
+    for name, value in [('files', batch['files']), ('files_finished', batch['finished']), ('progress_ratio', batch['progress']),
+            ('fps', batch['fps']), ('speed', batch['speed']), ('eta_seconds', batch['eta'])]:
+        lines.append(f"# TYPE reencode_batch_{name} gauge")
+        lines.append(f"reencode_batch_{name} {value if value is not None else 'NaN'}")
+    for name in ['progress', 'fps', 'speed', 'bitrate', 'eta', 'stalled']:
+        metric = { 'progress':'progress_ratio', 'bitrate':'bitrate_kbps', 'eta':'eta_seconds' }.get(name, name)
+        lines.append(f"# TYPE reencode_file_{metric} gauge")
+        for file in snapshot['files']:
+            value = file[name]
+            value = 'NaN' if value is None else int(value) if isinstance(value, bool) else value
+            label = file['input'].replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            lines.append(f"reencode_file_{metric}{{input=\"{label}\"}} {value}")
+    return "\n".join(lines) + "\n"
+
+def parsefloat(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # N/A before the first frame
+        return 0.0
+
+def formateta(seconds):
+    if seconds is None:
+        return "--:--:--"
+    return str(timedelta(seconds=int(seconds)))
+
+# QUEUE *********************************************************************
+
+# <input>.claim created atomically (O_EXCL) on the shared folder: running with a lease, then done
+def claimitem(item, node, lease=LEASE_SECONDS):
+    filepath = f"{item.input}{CLAIM_SUFFIX}"
+    for attempt in range(2):
+        try:
+            fd = os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            claim = readclaim(filepath)
+            if claim is None:
+                return False
+            if claim['state'] == 'done' and exists(item.output):
+                return False
+            if claim['state'] == 'running' and claim['expires'] > time.time():
+                return False
+            print(f"Abandoned claim of {claim['owner']} taken over: {item.input}")
+            if not breakclaim(filepath, claim):
+                return False
+            continue
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(newclaim(node, 'running', lease), file)
+        with CLAIMS_LOCK:
+            CLAIMS[filepath] = node
+        return True
+    return False
+
+def newclaim(node, state, lease=LEASE_SECONDS):
+    return {
+        'owner': f"{node}:{os.getpid()}",
+        'host': platform.node(),
+        'state': state,
+        'expires': time.time() + lease }
+
+def readclaim(filepath):
+    try:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        # being written by another node
+        return None
+
+# move the expired claim away, only one node succeeds; put it back if it was renewed meanwhile
+def breakclaim(filepath, claim):
+    stalepath = f"{filepath}.{os.getpid()}.stale"
+    try:
+        os.rename(filepath, stalepath)
+    except OSError:
+        return False
+    stale = readclaim(stalepath)
+    if stale != claim:
+        try:
+            os.link(stalepath, filepath)
+        except OSError:
+            pass
+        os.remove(stalepath)
+        return False
+    os.remove(stalepath)
+    return True
+
+def writeclaim(filepath, claim):
+    tmppath = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmppath, 'w', encoding='utf-8') as file:
+        json.dump(claim, file)
+    os.replace(tmppath, filepath)
+
+def isowned(filepath, node):
+    claim = readclaim(filepath)
+    return claim is not None and claim['owner'] == f"{node}:{os.getpid()}"
+
+def doneitem(item, node):
+    filepath = f"{item.input}{CLAIM_SUFFIX}"
+    with CLAIMS_LOCK:
+        CLAIMS.pop(filepath, None)
+    if not isowned(filepath, node):
+        print(f"Lease lost, another node took over: {item.input}")
+        return
+    writeclaim(filepath, newclaim(node, 'done'))
+
+def releaseitem(item):
+    filepath = f"{item.input}{CLAIM_SUFFIX}"
+    with CLAIMS_LOCK:
+        node = CLAIMS.pop(filepath, None)
+    if node is not None and isowned(filepath, node):
+        os.remove(filepath)
+
+# renew the leases of running items until the returned event is set
+def startheartbeat(lease=LEASE_SECONDS):
+    stop = threading.Event()
+    def beat():
+        while not stop.wait(min(HEARTBEAT_SECONDS, lease / 3)):
+            with CLAIMS_LOCK:
+                claims = dict(CLAIMS)
+            for filepath, node in claims.items():
+                if isowned(filepath, node):
+                    writeclaim(filepath, newclaim(node, 'running', lease))
+                else:
+                    print(f"Lease lost: {filepath}")
+    threading.Thread(target=beat, daemon=True).start()
+    return stop
+
+# JOURNAL *********************************************************************
+
+# sha256: checksum of every stage output (reads each file again after writing it and on each resume)
+def loadjournal(dirpath, compact=True, sha256=JOURNAL_CHECKSUM):
+    global JOURNAL_PATH, JOURNAL_SHA256
+    filepath = os.path.join(dirpath, JOURNAL_FILE)
+    JOURNAL_PATH = filepath
+    JOURNAL_SHA256 = sha256
+    with JOURNAL_LOCK:
+        JOURNAL.clear()
+    if not exists(filepath):
+        return
+    records = []
+    with open(filepath, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # last line of an interrupted run
+                continue
+    with JOURNAL_LOCK:
+        for record in records:
+            JOURNAL.setdefault(record['input'], {})[record['stage']] = record
+        compacted = [record for stages in JOURNAL.values() for record in stages.values()]
+    if not compact:
+        return
+    # keep only the last record of each stage
+    tmppath = f"{filepath}.tmp"
+    with open(tmppath, 'w', encoding='utf-8') as file:
+        for record in compacted:
+            file.write(json.dumps(record) + "\n")
+    os.replace(tmppath, filepath)
+
+# files written by the muxed stages: archives and ladder proxies (muxed<suffix>)
+def journaloutputs():
+    with JOURNAL_LOCK:
+        return { record['file'] for stages in JOURNAL.values() for stage, record in stages.items() if stage.startswith('muxed') and 'file' in record }
+
+# archive of each input muxed according to the journal
+def journalmuxed():
+    with JOURNAL_LOCK:
+        return { input: stages['muxed'].get('file') for input, stages in JOURNAL.items() if 'muxed' in stages }
+
+def journalstage(item, stage, filepath=None):
+    record = {
+        'input': os.path.abspath(item.input),
+        'stage': stage,
+        'fingerprint': probestat(item.input),
+        'time': datetime.now(timezone.utc).isoformat() }
+    if filepath is not None:
+        record['file'] = os.path.abspath(filepath)
+        stat = os.stat(filepath)
+        record['size'] = stat.st_size
+        record['mtime'] = stat.st_mtime_ns
+        if JOURNAL_SHA256:
+            record['sha256'] = checksum(filepath)
+    with JOURNAL_LOCK:
+        JOURNAL.setdefault(record['input'], {})[stage] = record
+        if JOURNAL_PATH is None:
+            return
+        with open(JOURNAL_PATH, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+def isjournaled(item, stage, filepath=None):
+    with JOURNAL_LOCK:
+        record = JOURNAL.get(os.path.abspath(item.input), {}).get(stage)
+    if record is None:
+        return False
+    if record['fingerprint'] != probestat(item.input):
+        return False
+    if filepath is None:
+        return True
+    if record.get('file') != os.path.abspath(filepath) or not exists(filepath):
+        return False
+    stat = os.stat(filepath)
+    if stat.st_size != record['size']:
+        return False
+    # records written before the mtime field: checked by checksum
+    if 'mtime' in record and stat.st_mtime_ns != record['mtime']:
+        return False
+    if (JOURNAL_SHA256 or 'mtime' not in record) and 'sha256' in record:
+        return checksum(filepath) == record['sha256']
+    return 'mtime' in record
+
+# skip a stage completed by a previous run, else discard its partial output and run it
+def resumestage(item, stage, filepath, function, *args):
+    if isjournaled(item, stage, filepath):
+        print(f"Resume {stage} (journal): {filepath}")
+        if stage in ['thumb', 'video', 'audio']:
+            setattr(item, stage, filepath)
+        return
+    if exists(filepath):
+        print(f"Discard partial {stage}: {filepath}")
+        os.remove(filepath)
+    timed(REPORT_STAGES.get(function.__name__, stage), item.input, function, *args, outputpath=filepath)
+    if exists(filepath):
+        journalstage(item, stage, filepath)
+
+def checksum(filepath):
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+# LOGS *********************************************************************
+
+def logconfig(path, mode=MODE, recursive=RECURSIVE, includes=FILTER_INCLUDES, excludes=FILTER_EXCLUDES, dedup=DEDUP, minbpp=MIN_BPP, tune=TUNE, tunetarget=None):
+    print("")
+    print("---------------------------- Configuration ----------------------------")
+    print("")
+    print(f"Input")
+    print(f"folder: {path}")
+    print(f"recursive: {recursive}")
+    print(f"filter (includes): {includes}")
+    print(f"filter (excludes): {excludes}")
+    print(f"filter (exts): {FILTER_EXTS}")
+    print(f"filter (codecs): {FILTER_EXCLUDE_CODECS} (remux)")
+    print(f"filter (min bpp): {minbpp}")
+    print(f"probe cache: {PROBE_CACHE_FILE}")
+    print(f"journal: {JOURNAL_FILE}")
+    print("")
+    print(f"Output")
+    print(f"name: *{OUTPUT_SUFFIX}")
+    print(f"mode: {mode}")
+    print(f"duplicates: {dedup} ({DEDUP_FILE})")
+    print(f"tune: {tune} {tunetarget or ''} ({TUNE_FILE})")
+    print("")
+
+def logscheduler(cores, jobs, threads, split=SPLIT, splitmin=SPLIT_MIN_DURATION, node=NODE, lease=LEASE_SECONDS, scratch=SCRATCH, scratchquota=SCRATCH_QUOTA, adaptive=CONTROL, order=ORDER, deadline=DEADLINE):
+    print("")
+    print("------------------------------ Scheduler ------------------------------")
+    print("")
+    print(f"cores: {cores}")
+    print(f"jobs (x265): {f'1 to {jobs}, adaptive' if adaptive else jobs}")
+    print(f"threads per job: {threads}")
+    print(f"jobs (audio): {LIGHT_JOBS}")
+    print(f"jobs (thumb): {THUMB_JOBS}")
+    print(f"order: {order}{f' (deadline {deadline})' if order == 'deadline' and deadline else ''}")
+    print(f"split: {split} segments for videos over {splitmin}s" if split > 1 else "split: off")
+    print(f"node: {node} (lease {lease}s, claims *{CLAIM_SUFFIX})" if node else "node: off")
+    print(f"scratch: {scratch or 'next to the input'} (quota {scratchquota or 'off'}, keep {SCRATCH_FREE} free)")
+    print("")
+
+def logladder(ladder):
+    if not ladder:
+        return
+    print("ladder (one decode):")
+    print(f"  *{OUTPUT_SUFFIX} archive")
+    for rung in ladder:
+        print(f"  *{rung['suffix']} {rung['height']}p crf {rung['crf']} {LADDER_PRESET}")
+    print("")
+
+def logsource(item):
+    print("")
+    print("------------------------- Source Script Info -------------------------")
+    print("")
+    print(f"index: {item.index}")
+    print(f"input: {item.input}")
+    print("")
+
+def logtarget(item):
+    print("")
+    print("------------------------- Target Script Info -------------------------")
+    print("")
+    print(f"output: {item.output}")
+    print("")
+
+def logvideo(item):
+    print("")
+    print("------------------------- Video encoding x265 -------------------------")
+    print("")
+    
+def logvideo(item):
+    print("")
+    print("---------------------------- Muxing to MP4 ----------------------------")
+    print("")
+
+def logsystem(system):
+    pressure = system['pressure']
+    return f"load {system['load']:.1f}/{system['cores']}, {system['memory'] / 1024 ** 3:.1f} GB available, psi cpu {pressure['cpu']:.1f} memory {pressure['memory']:.1f} io {pressure['io']:.1f}"
+
+def logplan(items, costs, ends, jobs, budget, speed, bpp, runs):
+    saved = sum(costs[item.input][1] for item in items)
+    print("")
+    print("--------------------------------- Plan --------------------------------")
+    print("")
+    print(f"calibration: {speed / 1000000:.1f} Mpixel/s per job, {bpp:.3f} bpp output ({f'last {runs} encodes of the report' if runs else 'defaults, no encode in the report'})")
+    print(f"end;seconds;saved MB;input;")
+    for item, end in zip(items, ends):
+        seconds, bytes = costs[item.input]
+        late = "after deadline;" if budget is not None and end > budget else ""
+        print(f"{formateta(end)};{seconds:.1f};{bytes / 1024 / 1024:.1f};{item.input};{late}")
+    print(f"predicted time: {formateta(max(ends, default=0))} with {jobs} jobs")
+    if budget is not None:
+        print(f"deadline: in {formateta(budget)}")
+    print(f"predicted space saved: {saved / 1024 / 1024:.1f} MB")
+    print("")
+
+def logprogress(snapshot):
+    batch = snapshot['batch']
+    if not batch['files']:
+        return
+    for file in snapshot['files']:
+        state = "stalled " if file['stalled'] else ""
+        print(f"Progress {state}{file['progress'] * 100:5.1f}% {file['fps']:.1f} fps x{file['speed']:.2f} {file['bitrate']:.0f} kbit/s ETA {formateta(file['eta'])}: {file['input']}")
+    print(f"Batch {batch['finished']}/{batch['files']} files {batch['progress'] * 100:5.1f}% {batch['fps']:.1f} fps x{batch['speed']:.2f} ETA {formateta(batch['eta'])}")
+
+def logcsv(items):
+    print("")
+    print("-------------------------- Printing to CSV ----------------------------")
+    print("")
+    print(f"index;input;output;archive;")
+    for item in items:
+        print(f"{item.index};{item.input};{item.output};")
+    print("")
+
+def logtimes(items, walltime):
+    summed = sum(item.elapsed for item in items)
+    speedup = summed / walltime if walltime > 0 else 0
+    written = sum(item.written for item in items)
+    modes = sorted(set(item.mode for item in items))
+    print("")
+    print("-------------------------------- Times --------------------------------")
+    print("")
+    print(f"wall time: {walltime:.1f}s")
+    print(f"summed job time: {summed:.1f}s")
+    print(f"speedup: x{speedup:.2f}")
+    print(f"bytes written: {written} ({written / 1024 / 1024:.1f} MB)")
+    print(f"modes: {modes}")
+    print("")
+
+# SCRIPT **********************************************************************
+
+# options of the encode stage (encodebatch keywords), also read by ffmpegcamera.pipeline and ffmpegcamera.watch
+ENCODE_ARGS = [
+    { 'opt':'jobs',  'defarg':f"{JOBS}", 'kwarg':'jobs', 'parse':int },
+    { 'opt':'threads-per-job',  'defarg':f"{THREADS_PER_JOB}", 'kwarg':'threadsperjob', 'parse':int },
+    { 'opt':'cores',  'defarg':f"{os.cpu_count() or 1}", 'kwarg':'cores', 'parse':int },
+    { 'opt':'mode',  'defarg':MODE, 'kwarg':'mode', 'parse':str },
+    { 'opt':'dedup', 'shortopt':'u', 'defarg':DEDUP, 'kwarg':'dedup', 'parse':str },
+    { 'opt':'fullhash',  'defarg':f"{DEDUP_FULLHASH}", 'kwarg':'fullhash', 'parse':parsebool },
+    { 'opt':'min-bpp', 'shortopt':'b', 'defarg':f"{MIN_BPP}", 'kwarg':'minbpp', 'parse':float },
+    { 'opt':'tune', 'shortopt':'q', 'defarg':TUNE, 'kwarg':'tune', 'parse':str },
+    { 'opt':'tune-target', 'shortopt':'g', 'defarg':'', 'kwarg':'tunetarget', 'parse':lambda arg: float(arg) if arg else None },
+    { 'opt':'split', 'shortopt':'s', 'defarg':f"{SPLIT}", 'kwarg':'split', 'parse':int },
+    { 'opt':'split-min', 'shortopt':'l', 'defarg':f"{SPLIT_MIN_DURATION}", 'kwarg':'splitmin', 'parse':float },
+    { 'opt':'node', 'shortopt':'n', 'defarg':NODE, 'kwarg':'node', 'parse':str },
+    { 'opt':'lease', 'shortopt':'a', 'defarg':f"{LEASE_SECONDS}", 'kwarg':'lease', 'parse':float },
+    { 'opt':'metrics', 'shortopt':'p', 'defarg':'', 'kwarg':'metricspath', 'parse':str },
+    { 'opt':'scratch', 'shortopt':'w', 'defarg':SCRATCH, 'kwarg':'scratch', 'parse':str },
+    { 'opt':'scratch-quota', 'shortopt':'z', 'defarg':f"{SCRATCH_QUOTA}", 'kwarg':'scratchquota', 'parse':parsesize },
+    { 'opt':'sheet', 'shortopt':'k', 'defarg':f"{THUMB_SHEET}", 'kwarg':'sheet', 'parse':parsebool },
+    { 'opt':'strip', 'shortopt':'x', 'defarg':f"{THUMB_STRIP}", 'kwarg':'strip', 'parse':parsebool },
+    { 'opt':'adaptive', 'shortopt':'y', 'defarg':f"{CONTROL}", 'kwarg':'adaptive', 'parse':parsebool },
+    { 'opt':'order', 'shortopt':'O', 'defarg':ORDER, 'kwarg':'order', 'parse':str },
+    { 'opt':'deadline', 'shortopt':'D', 'defarg':DEADLINE, 'kwarg':'deadline', 'parse':str },
+    { 'opt':'ladder', 'shortopt':'L', 'defarg':LADDER, 'kwarg':'ladder', 'parse':parseladder },
+    { 'opt':'checksum', 'shortopt':'C', 'defarg':f"{JOURNAL_CHECKSUM}", 'kwarg':'sha256', 'parse':parsebool }]
+
+def main(argv):
+    argd = getargs(argv, mergeargs([
+        { 'opt':'dirpath',  'defarg':'.' },
+        { 'opt':'recursive',  'defarg':f"{RECURSIVE}" },
+        { 'opt':'include',  'defarg':",".join(FILTER_INCLUDES) },
+        { 'opt':'exclude',  'defarg':",".join(FILTER_EXCLUDES) },
+        { 'opt':'report', 'shortopt':'o', 'defarg':'' }], ENCODE_ARGS))
+    dirpath = argd.get("dirpath")
+    recursive = argd.get("recursive") == 'True'
+    includes = splitpatterns(argd.get("include"))
+    excludes = splitpatterns(argd.get("exclude"))
+    reportpath = argd.get("report")
+    options = parsekwargs(argd, ENCODE_ARGS)
+    print("FFMEPG Re-encode")
+    print(f'Exec. path : {os.getcwd()}')
+    # TODO: install()
+    process(dirpath, recursive=recursive, includes=includes, excludes=excludes, reportpath=reportpath, **options)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
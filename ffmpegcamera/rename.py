@@ -0,0 +1,306 @@
+import sys, os, json
+from datetime import datetime, timezone, timedelta
+from os.path import exists
+import re, struct, errno
+from concurrent.futures import ThreadPoolExecutor
+from .core import (REPORT_FILE, getfiles, listfiles, filterbyext, probeitem, moveprobecache, loadprobecache, saveprobecache,
+    openreport, timed, logreport, getargs, splitpatterns)
+
+# STATIC **********************************************************************
+
+FILTER_EXTS = ['mp4', 'jpg', 'png']
+FILTER_INCLUDES = ['*.*']
+FILTER_EXCLUDES = ['.*', '*_temp']
+RECURSIVE = False
+OUTPUT_DATE_REG = r'^[0-9]{8}_[0-9]{6}.*'
+OUTPUT_DATE_PATTERN = "%Y%m%d_%H%M%S"
+METADATA_DATE_PATTERN = "%Y-%m-%dT%H:%M:%S.%f%z"
+EXIF_DATE_PATTERN = "%Y:%m:%d %H:%M:%S"
+MP4_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc) # mvhd times are seconds since 1904
+READ_JOBS = 8 # files whose dates are read at once
+
+UNDO_FILE = '.renamectime-undo.json'
+REPORT_SCRIPT = 'renamectime'
+
+# PRIVATE *********************************************************************
+
+def process(videosdirpath, recursive=RECURSIVE, includes=FILTER_INCLUDES, excludes=FILTER_EXCLUDES, reportpath=None, undo=False, files=None):
+    print("Start")
+    items = []
+    loadprobecache(videosdirpath)
+    if undo:
+        undorenames(videosdirpath)
+        saveprobecache(videosdirpath)
+        return items
+    openreport(reportpath or os.path.join(videosdirpath, REPORT_FILE), REPORT_SCRIPT)
+    found = getfiles(videosdirpath, includes, excludes, recursive) if files is None else listfiles(files)
+    try:
+        items = renamebatch(videosdirpath, found)
+    finally:
+        saveprobecache(videosdirpath)
+    logreport()
+    return items
+
+# rename stage over found items: a folder scan, given files or the items of ffmpegcamera.pipeline
+def renamebatch(videosdirpath, found):
+    items = []
+    torename = []
+    for item in filterbyext(found, FILTER_EXTS):
+        items.append(item)
+        if hasdatename(item, OUTPUT_DATE_REG): 
+            continue
+        torename.append(item)
+    # dates read from the file headers in parallel, renames in order
+    with ThreadPoolExecutor(max_workers=READ_JOBS) as pool:
+        list(pool.map(lambda item: getctime(item, OUTPUT_DATE_PATTERN, METADATA_DATE_PATTERN), torename))
+    # every target known before the first rename, the manifest written before the first rename
+    planrenames(torename)
+    saveundo(videosdirpath, torename)
+    applyrenames(torename)
+    return items
+
+# FUNCTIONS *********************************************************************
+
+# <date>-<name>, <date>-<name>-1... when the name is taken on disk or by another file of the batch
+def planrenames(items):
+    planned = set()
+    for item in items:
+        dirname = os.path.dirname(item.input)
+        name, ext = os.path.splitext(os.path.basename(item.input))
+        target = os.path.join(dirname, f"{item.datestr}-{name}{ext}")
+        index = 1
+        while os.path.normcase(target) in planned or exists(target):
+            target = os.path.join(dirname, f"{item.datestr}-{name}-{index}{ext}")
+            index = index + 1
+        if index > 1:
+            print(f"Name collision, renamed to {os.path.basename(target)}: {item.input}")
+        planned.add(os.path.normcase(target))
+        item.target = target
+
+# all or nothing: renames done before an error are reverted
+def applyrenames(items):
+    done = []
+    try:
+        for item in items:
+            timed('rename', item.input, rename, item)
+            done.append(item)
+    except OSError as error:
+        print(f"Rename failed ({error}), rolling back {len(done)} renames")
+        for item in reversed(done):
+            os.rename(item.newname, item.input)
+            moveprobecache(item.newname, item.input)
+            item.newname = ""
+        raise
+
+# same folder: an atomic rename of the directory entry
+def rename(item):
+    if exists(item.target):
+        raise FileExistsError(errno.EEXIST, "Target exists", item.target)
+    os.rename(item.input, item.target)
+    item.newname = item.target
+    moveprobecache(item.input, item.newname)
+
+def saveundo(dirpath, items):
+    if not items:
+        return
+    data = {
+        'run': datetime.now(timezone.utc).isoformat(),
+        'renames': [{ 'old': os.path.abspath(item.input), 'new': os.path.abspath(item.target) } for item in items] }
+    filepath = os.path.join(dirpath, UNDO_FILE)
+    tmppath = f"{filepath}.tmp"
+    with open(tmppath, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmppath, filepath)
+
+# revert the last batch, skipping files moved or replaced since
+def undorenames(dirpath):
+    filepath = os.path.join(dirpath, UNDO_FILE)
+    if not exists(filepath):
+        print(f"Nothing to undo: {filepath} not found")
+        return
+    with open(filepath, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    undone = 0
+    for entry in reversed(data['renames']):
+        old, new = entry['old'], entry['new']
+        if not exists(new) or exists(old):
+            print(f"Skip undo of {new}: {'not found' if not exists(new) else f'{old} exists'}")
+            continue
+        os.rename(new, old)
+        moveprobecache(new, old)
+        undone = undone + 1
+    os.remove(filepath)
+    print(f"Undone {undone}/{len(data['renames'])} renames of {data['run']}")
+
+def getctime(item, tpl, tpl2):
+    ts = os.path.getctime(item.input)
+    utc_dt = datetime.fromtimestamp(ts)
+    if item.ext == 'mp4':
+        utc_dt = getctimevideo(item, tpl2) or utc_dt
+    elif item.ext in ['jpg', 'png']:
+        utc_dt = getctimeimage(item) or utc_dt
+    loc_dt = utc_to_local(utc_dt) 
+    ctime = utc_dt.astimezone().strftime(tpl)
+    item.datestr = ctime
+
+def getctimevideo(item, tpl2):
+    try:
+        seconds = readmvhd(item.input)
+        # 0 : no date written by the camera
+        return MP4_EPOCH + timedelta(seconds=seconds) if seconds else None
+    except (OSError, ValueError, struct.error) as error:
+        print(f"mvhd not read ({error}), ffprobe: {item.input}")
+    datestr = probeitem(item).creation_time
+    return datetime.strptime(datestr, tpl2) if datestr else None
+
+def getctimeimage(item):
+    try:
+        return readexif(item.input, item.ext)
+    except (OSError, ValueError, IndexError, struct.error) as error:
+        print(f"EXIF not read ({error}): {item.input}")
+        return None
+
+def hasdatename(item, pattern):
+    basename = os.path.basename(item.input)
+    return re.match(pattern, basename)
+
+# METADATA *********************************************************************
+
+# creation time of moov/mvhd, seeking over the other boxes (mdat) with small reads
+def readmvhd(path):
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        moov = findbox(file, b'moov', 0, size)
+        if moov is None:
+            raise ValueError("no moov box")
+        mvhd = findbox(file, b'mvhd', *moov)
+        if mvhd is None:
+            raise ValueError("no mvhd box")
+        file.seek(mvhd[0])
+        data = file.read(12)
+    # version 1: 64 bits times
+    if data[0] == 1:
+        return struct.unpack('>Q', data[4:12])[0]
+    return struct.unpack('>I', data[4:8])[0]
+
+# payload (start, end) of the first box of this type between start and end
+def findbox(file, boxtype, start, end):
+    offset = start
+    while offset + 8 <= end:
+        file.seek(offset)
+        header = file.read(16)
+        size, kind = struct.unpack('>I4s', header[:8])
+        headersize = 8
+        if size == 1:
+            size = struct.unpack('>Q', header[8:16])[0]
+            headersize = 16
+        elif size == 0:
+            size = end - offset
+        if size < headersize:
+            raise ValueError(f"bad box size at {offset}")
+        if kind == boxtype:
+            return offset + headersize, offset + size
+        offset += size
+    return None
+
+def readexif(path, ext):
+    with open(path, 'rb') as file:
+        tiff = findjpegexif(file) if ext == 'jpg' else findpngexif(file)
+    if tiff is None:
+        return None
+    return exifdate(tiff)
+
+# APP1 segment starting with Exif, before the image data
+def findjpegexif(file):
+    if file.read(2) != b'\xff\xd8':
+        raise ValueError("not a jpeg")
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF or marker[1] in (0xD9, 0xDA):
+            return None
+        length = struct.unpack('>H', file.read(2))[0]
+        if marker[1] == 0xE1:
+            data = file.read(length - 2)
+            if data.startswith(b'Exif\x00\x00'):
+                return data[6:]
+        else:
+            file.seek(length - 2, os.SEEK_CUR)
+
+def findpngexif(file):
+    if file.read(8) != b'\x89PNG\r\n\x1a\n':
+        raise ValueError("not a png")
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            return None
+        length, kind = struct.unpack('>I4s', header)
+        if kind == b'eXIf':
+            return file.read(length)
+        if kind == b'IEND':
+            return None
+        # data and crc
+        file.seek(length + 4, os.SEEK_CUR)
+
+# DateTimeOriginal, DateTimeDigitized then DateTime (local time, with OffsetTimeOriginal when written)
+def exifdate(tiff):
+    order = { b'II':'<', b'MM':'>' }.get(tiff[:2])
+    if order is None:
+        raise ValueError("bad tiff header")
+    tags = readifd(tiff, struct.unpack(f"{order}I", tiff[4:8])[0], order)
+    exif = readifd(tiff, tags[0x8769], order) if 0x8769 in tags else {}
+    offset = exif.get(0x9011, "")
+    for tag, source in [(0x9003, exif), (0x9004, exif), (0x0132, tags)]:
+        value = source.get(tag)
+        if not value:
+            continue
+        try:
+            if offset:
+                return datetime.strptime(f"{value}{offset}", f"{EXIF_DATE_PATTERN}%z")
+            return datetime.strptime(value, EXIF_DATE_PATTERN)
+        except ValueError:
+            continue
+    return None
+
+# ASCII and LONG values of an IFD by tag
+def readifd(tiff, offset, order):
+    count = struct.unpack(f"{order}H", tiff[offset:offset + 2])[0]
+    tags = {}
+    for index in range(count):
+        entry = tiff[offset + 2 + index * 12:offset + 14 + index * 12]
+        tag, kind, length = struct.unpack(f"{order}HHI", entry[:8])
+        if kind == 2:
+            start = struct.unpack(f"{order}I", entry[8:])[0] if length > 4 else None
+            raw = entry[8:8 + length] if start is None else tiff[start:start + length]
+            tags[tag] = raw.split(b'\x00')[0].decode('ascii', errors='replace').strip()
+        elif kind == 4:
+            tags[tag] = struct.unpack(f"{order}I", entry[8:])[0]
+    return tags
+
+def utc_to_local(utc_dt):
+    return utc_dt.replace(tzinfo=timezone.utc).astimezone(tz=None)
+
+# SCRIPT **********************************************************************
+
+def main(argv):
+    argd = getargs(argv, [
+        { 'opt':'dirpath',  'defarg':'.' },
+        { 'opt':'recursive',  'defarg':f"{RECURSIVE}" },
+        { 'opt':'include',  'defarg':",".join(FILTER_INCLUDES) },
+        { 'opt':'exclude',  'defarg':",".join(FILTER_EXCLUDES) },
+        { 'opt':'report', 'shortopt':'o', 'defarg':'' },
+        { 'opt':'undo',  'defarg':'False' }])
+    dirpath = argd.get("dirpath")
+    recursive = argd.get("recursive") == 'True'
+    includes = splitpatterns(argd.get("include"))
+    excludes = splitpatterns(argd.get("exclude"))
+    reportpath = argd.get("report")
+    undo = argd.get("undo") == 'True'
+    print("FFMEPG Re-name with Create Time")
+    print(f'Exec. path : {os.getcwd()}')
+    # TODO: install()
+    process(dirpath, recursive, includes, excludes, reportpath, undo)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,245 @@
+import sys, os, queue, threading, time
+from os.path import exists
+from dataclasses import dataclass
+from . import pipeline, reencode
+from .core import walkfiles, matches, stoprunner, getargs, parsekwargs, mergeargs
+try:
+    # Linux: pip install inotify_simple
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+# STATIC **********************************************************************
+
+RECURSIVE = False
+POLL_SECONDS = 10 # folder scan interval without inotify
+FORCE_POLL = False # scan even with inotify: writes from other hosts on a NAS share raise no event
+STABLE_SECONDS = 30 # size and mtime unchanged for this long: copy finished
+QUEUE_SIZE = 16 # ready files waiting for the pipeline, the watcher blocks when full
+BATCH_SIZE = 8
+CLEAN = False
+
+# PUBLIC **********************************************************************
+
+# a file being written: last size and mtime seen, and since when
+@dataclass(slots=True)
+class Pending:
+    size: int = -1
+    mtime: int = 0 # ns
+    since: float = 0.0 # time.monotonic()
+
+# inotify instance and the folder of each watch descriptor
+@dataclass(slots=True)
+class Watch:
+    notify: object = None
+    watches: dict = None
+    mask: int = 0
+    recursive: bool = False
+
+# PRIVATE *********************************************************************
+
+# options: keywords of ffmpegcamera.reencode.encodebatch (jobs, mode...)
+def process(videosdirpath, recursive=RECURSIVE, poll=POLL_SECONDS, stable=STABLE_SECONDS, clean=CLEAN, forcepoll=FORCE_POLL, **options):
+    print("Start")
+    logconfig(videosdirpath, recursive, poll, stable, clean, forcepoll)
+
+    ready = queue.Queue(maxsize=QUEUE_SIZE)
+    handled = set()
+    handledlock = threading.Lock()
+    retry = queue.Queue() # files of failed batches, watched again
+    worker = threading.Thread(target=runpipeline, daemon=True,
+        args=(videosdirpath, ready, retry, handled, handledlock, clean, options))
+    worker.start()
+
+    print("Watching (Ctrl-C to stop)")
+    pending = {}
+    watch = None if forcepoll else openinotify(videosdirpath, recursive)
+    # files already in the folder go through the same pipeline
+    scanfolder(videosdirpath, recursive, pending, handled, handledlock)
+    try:
+        while True:
+            if watch is not None:
+                for filepath in readinotify(watch, poll):
+                    if acceptfile(filepath, videosdirpath):
+                        pending.setdefault(filepath, Pending())
+            else:
+                time.sleep(poll)
+                scanfolder(videosdirpath, recursive, pending, handled, handledlock)
+            while not retry.empty():
+                pending.setdefault(retry.get(), Pending())
+            for filepath in stablefiles(pending, stable):
+                with handledlock:
+                    if filepath in handled:
+                        continue
+                    handled.add(filepath)
+                print(f"Ready: {filepath}")
+                # backpressure: wait for the pipeline when the queue is full
+                ready.put(filepath)
+    except KeyboardInterrupt:
+        print("Stop")
+        # the pipeline thread does not get Ctrl-C: kill its ffmpeg commands
+        stoprunner()
+    print('End')
+
+# FUNCTIONS *********************************************************************
+
+# excluded names checked on each folder under the watched one too (split segments in <input>_temp)
+def acceptfile(filepath, dirpath):
+    name = os.path.basename(filepath)
+    names = os.path.relpath(filepath, dirpath).split(os.sep)
+    if any(matches(part, reencode.FILTER_EXCLUDES) for part in names):
+        return False
+    ext = os.path.splitext(name)[1].replace('.', '').lower()
+    return os.path.isfile(filepath) and ext in reencode.FILTER_EXTS
+
+def scanfolder(dirpath, recursive, pending, handled, handledlock):
+    files = walkfiles(dirpath, reencode.FILTER_INCLUDES, reencode.FILTER_EXCLUDES, recursive)
+    for filepath in files:
+        with handledlock:
+            if filepath in handled:
+                continue
+        if acceptfile(filepath, dirpath):
+            pending.setdefault(filepath, Pending())
+
+# debounce: a file is ready once its size and mtime stop changing
+def stablefiles(pending, stable):
+    now = time.monotonic()
+    for filepath, state in list(pending.items()):
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            del pending[filepath]
+            continue
+        if stat.st_size != state.size or stat.st_mtime_ns != state.mtime:
+            state.size = stat.st_size
+            state.mtime = stat.st_mtime_ns
+            state.since = now
+            continue
+        if now - state.since >= stable:
+            del pending[filepath]
+            yield filepath
+
+def openinotify(dirpath, recursive):
+    if INotify is None:
+        print("inotify_simple not installed, polling the folder")
+        return None
+    watch = Watch(notify=INotify(), watches={}, mask=flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE, recursive=recursive)
+    dirs = [root for root, _ in walkfolders(dirpath)] if recursive else [dirpath]
+    for folder in dirs:
+        watch.watches[watch.notify.add_watch(folder, watch.mask)] = folder
+    return watch
+
+def readinotify(watch, timeout):
+    for event in watch.notify.read(timeout=int(timeout * 1000)):
+        folder = watch.watches.get(event.wd)
+        if folder is None or not event.name:
+            continue
+        filepath = os.path.join(folder, event.name)
+        if event.mask & flags.ISDIR:
+            # new sub folder (card dump): watch it too, with the files already in it (moved in, or copied before the watch)
+            if watch.recursive and exists(filepath) and not matches(event.name, reencode.FILTER_EXCLUDES):
+                yield from watchfolder(watch, filepath)
+            continue
+        yield filepath
+
+def watchfolder(watch, dirpath):
+    for root, files in walkfolders(dirpath):
+        watch.watches[watch.notify.add_watch(root, watch.mask)] = root
+        for file in files:
+            yield os.path.join(root, file)
+
+# the folder and its sub folders, without the excluded ones (<input>_temp of the encodes)
+def walkfolders(dirpath):
+    for root, dirs, files in os.walk(dirpath):
+        dirs[:] = [name for name in dirs if not matches(name, reencode.FILTER_EXCLUDES)]
+        yield root, files
+
+# rename, encode (and clean) ready files by batches
+def runpipeline(dirpath, ready, retry, handled, handledlock, clean, options):
+    while True:
+        files = [ready.get()]
+        while len(files) < BATCH_SIZE:
+            try:
+                files.append(ready.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            runbatch(dirpath, files, retry, handled, handledlock, clean, options)
+        except Exception as error:
+            print(f"Pipeline failed for {files}: {error}")
+        finally:
+            for _ in files:
+                ready.task_done()
+
+def runbatch(dirpath, files, retry, handled, handledlock, clean, options):
+    start = time.monotonic()
+    # moved or deleted while queued: dropped from the batch, new files if they come back
+    vanished = [filepath for filepath in files if not exists(filepath)]
+    for filepath in vanished:
+        print(f"Vanished: {filepath}")
+    with handledlock:
+        handled.difference_update(vanished)
+    files = [filepath for filepath in files if filepath not in vanished]
+    if not files:
+        return
+    batch = set(files)
+    # renamed inputs are not new files: handled before the encode, while the watcher sees them
+    def renamed(items):
+        newnames = [item.newname for item in items if item.newname]
+        batch.update(newnames)
+        with handledlock:
+            handled.update(newnames)
+    try:
+        items = pipeline.process(dirpath, files=files, clean=clean, renamed=renamed, **options)
+    except Exception:
+        # watched again, queued once stable (the journal skips what was done)
+        with handledlock:
+            handled.difference_update(batch)
+        for filepath in batch:
+            if exists(filepath):
+                retry.put(filepath)
+        raise
+    # outputs are not new files either
+    with handledlock:
+        handled.update(item.input for item in items)
+        handled.update(os.path.abspath(item.output) for item in items if item.output)
+    print(f"Batch of {len(files)} done in {time.monotonic() - start:.1f}s")
+
+# LOGS *********************************************************************
+
+def logconfig(path, recursive, poll, stable, clean, forcepoll=FORCE_POLL):
+    print("")
+    print("---------------------------- Configuration ----------------------------")
+    print("")
+    print(f"folder: {path}")
+    print(f"recursive: {recursive}")
+    print(f"watch: {'inotify' if INotify is not None and not forcepoll else f'polling every {poll}s'}")
+    print(f"stable after: {stable}s")
+    print(f"queue: {QUEUE_SIZE} files, batches of {BATCH_SIZE}")
+    print(f"pipeline: rename, encode{', clean' if clean else ''}")
+    print("")
+
+# SCRIPT **********************************************************************
+
+# the options of ffmpegcamera.reencode, long opt only when the short one is taken here
+def main(argv):
+    argd = getargs(argv, mergeargs([
+        { 'opt':'dirpath',  'defarg':'.' },
+        { 'opt':'recursive',  'defarg':f"{RECURSIVE}" },
+        { 'opt':'poll',  'defarg':f"{POLL_SECONDS}" },
+        { 'opt':'stable',  'defarg':f"{STABLE_SECONDS}" },
+        { 'opt':'clean',  'defarg':f"{CLEAN}" },
+        { 'opt':'force-poll',  'defarg':f"{FORCE_POLL}" }], reencode.ENCODE_ARGS))
+    dirpath = argd.get("dirpath")
+    recursive = argd.get("recursive") == 'True'
+    poll = float(argd.get("poll"))
+    stable = float(argd.get("stable"))
+    clean = argd.get("clean") == 'True'
+    forcepoll = argd.get("force-poll") == 'True'
+    options = parsekwargs(argd, reencode.ENCODE_ARGS)
+    print("FFMEPG Watch folder")
+    print(f'Exec. path : {os.getcwd()}')
+    process(dirpath, recursive, poll, stable, clean, forcepoll, **options)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,6 +1,5 @@
 
 SET DIRPATH="C:\Users\damien\Desktop\100MEDIA"
 
-python .\ffmpeg-renamectime.py --dirpath %DIRPATH%
-python .\ffmpeg-reencodex265.py --dirpath %DIRPATH%
-@REM python .\ffmpeg-clean.py --dirpath %DIRPATH%
\ No newline at end of file
+python .\ffmpeg-pipeline.py --dirpath %DIRPATH%
+@REM python .\ffmpeg-pipeline.py --dirpath %DIRPATH% --clean True
\ No newline at end of file
@@ -0,0 +1,95 @@
+import os, sys, json, time, random
+import multiprocessing
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ffmpegcamera import reencode
+from ffmpegcamera.core import Item
+
+# several local processes acting as nodes on one shared folder, with a stubbed encode
+
+NODES = 4
+FILES = 12
+LEASE = 1.0 # seconds, renewed by the heartbeat every LEASE / 3
+SLOW = 'slow.mp4' # encoded for longer than the lease: only the heartbeat keeps it
+
+def runnode(node, dirpath, logpath, seconds):
+    stop = reencode.startheartbeat(LEASE)
+    names = sorted(name for name in os.listdir(dirpath) if name.endswith('.mp4'))
+    random.Random(node).shuffle(names)
+    # idle nodes keep passing over the folder: a lease not renewed in time would be taken over
+    deadline = time.time() + seconds
+    try:
+        while names and time.time() < deadline:
+            for name in names:
+                item = Item(input=os.path.join(dirpath, name))
+                item.output = reencode.replacesuffix(item.input, reencode.OUTPUT_SUFFIX)
+                if not reencode.claimitem(item, node, LEASE):
+                    continue
+                encode(item, node, logpath)
+                reencode.doneitem(item, node)
+            names = [name for name in names if not isdone(os.path.join(dirpath, name))]
+            time.sleep(LEASE / 5)
+    finally:
+        stop.set()
+
+def isdone(input):
+    claim = reencode.readclaim(f"{input}{reencode.CLAIM_SUFFIX}")
+    return claim is not None and claim['state'] == 'done'
+
+def encode(item, node, logpath):
+    time.sleep(3 * LEASE if item.input.endswith(SLOW) else 0.05)
+    with open(item.output, 'w', encoding='utf-8') as file:
+        file.write(node)
+    with open(logpath, 'a', encoding='utf-8') as file:
+        file.write(f"{os.path.basename(item.input)};{node}\n")
+
+def runnodes(dirpath, seconds=30):
+    logpath = os.path.join(dirpath, 'encoded.log')
+    context = multiprocessing.get_context('spawn')
+    procs = [context.Process(target=runnode, args=(f"node{index}", str(dirpath), logpath, seconds)) for index in range(NODES)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(60)
+        assert proc.exitcode == 0
+    with open(logpath, 'r', encoding='utf-8') as file:
+        return [line.strip().split(';') for line in file]
+
+def createfiles(dirpath, names):
+    for name in names:
+        (dirpath / name).write_bytes(b'')
+
+def claimof(dirpath, name):
+    with open(dirpath / f"{name}{reencode.CLAIM_SUFFIX}", 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def test_each_item_encoded_once(tmp_path):
+    names = [f"clip{index:02d}.mp4" for index in range(FILES)] + [SLOW]
+    createfiles(tmp_path, names)
+    encoded = runnodes(tmp_path)
+    assert sorted(name for name, node in encoded) == sorted(names)
+    assert len(set(node for name, node in encoded)) > 1
+    for name in names:
+        assert claimof(tmp_path, name)['state'] == 'done'
+
+def test_expired_lease_taken_over(tmp_path):
+    names = [f"clip{index:02d}.mp4" for index in range(FILES)]
+    createfiles(tmp_path, names)
+    # a node that died while encoding the first clip: its lease is over
+    dead = { 'owner': 'dead:1', 'host': 'gone', 'state': 'running', 'expires': time.time() - 1 }
+    (tmp_path / f"{names[0]}{reencode.CLAIM_SUFFIX}").write_text(json.dumps(dead), encoding='utf-8')
+    encoded = runnodes(tmp_path)
+    assert sorted(name for name, node in encoded) == sorted(names)
+    claim = claimof(tmp_path, names[0])
+    assert claim['state'] == 'done'
+    assert not claim['owner'].startswith('dead:')
+
+def test_running_lease_not_taken_over(tmp_path):
+    names = [f"clip{index:02d}.mp4" for index in range(FILES)]
+    createfiles(tmp_path, names)
+    # a live node encoding the first clip elsewhere
+    running = { 'owner': 'live:1', 'host': 'other', 'state': 'running', 'expires': time.time() + 60 }
+    (tmp_path / f"{names[0]}{reencode.CLAIM_SUFFIX}").write_text(json.dumps(running), encoding='utf-8')
+    # polling for longer than the lease of the nodes
+    encoded = runnodes(tmp_path, 3 * LEASE)
+    assert sorted(name for name, node in encoded) == sorted(names[1:])
+    assert claimof(tmp_path, names[0])['owner'] == 'live:1'
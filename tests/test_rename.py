@@ -0,0 +1,241 @@
+import os, sys, struct, errno
+from datetime import datetime, timezone, timedelta
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ffmpegcamera import rename
+from ffmpegcamera.core import Item
+
+# date readers over synthetic files: mp4 boxes, jpeg and png EXIF
+
+CREATED = 3700000000 # 2021-03-31, seconds since 1904
+CREATED64 = 5 * 2 ** 32 # after 2040: 64 bits times only
+
+def box(kind, payload):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+# 64 bits size in the header, as for an mdat over 4 GB
+def largebox(kind, payload):
+    return struct.pack('>I4sQ', 1, kind, 16 + len(payload)) + payload
+
+def mvhd(seconds, version=0):
+    if version == 1:
+        times = struct.pack('>QQI', seconds, seconds, 1000)
+    else:
+        times = struct.pack('>III', seconds, seconds, 1000)
+    return box(b'mvhd', bytes([version, 0, 0, 0]) + times + bytes(80))
+
+def writemp4(path, *boxes):
+    path.write_bytes(box(b'ftyp', b'isom\x00\x00\x02\x00') + b''.join(boxes))
+    return str(path)
+
+# TIFF with IFD0, the EXIF IFD (0x8769) when tags are given, and the strings over 4 bytes after both
+def tiff(order, tags, exiftags=None):
+    fmt = '<' if order == b'II' else '>'
+    ifd0 = dict(tags)
+    ifdsize = lambda entries: 2 + 12 * len(entries) + 4
+    exifoffset = 8 + ifdsize(ifd0) + (12 if exiftags else 0)
+    if exiftags:
+        ifd0[0x8769] = exifoffset
+    dataoffset = exifoffset + (ifdsize(exiftags) if exiftags else 0)
+    data = bytearray()
+    def ifd(entries):
+        out = struct.pack(f"{fmt}H", len(entries))
+        for tag, value in sorted(entries.items()):
+            if isinstance(value, int):
+                out += struct.pack(f"{fmt}HHII", tag, 4, 1, value)
+                continue
+            raw = value.encode('ascii') + b'\x00'
+            if len(raw) <= 4:
+                out += struct.pack(f"{fmt}HHI", tag, 2, len(raw)) + raw.ljust(4, b'\x00')
+            else:
+                out += struct.pack(f"{fmt}HHII", tag, 2, len(raw), dataoffset + len(data))
+                data.extend(raw)
+        return out + bytes(4)
+    body = ifd(ifd0) + (ifd(exiftags) if exiftags else b'')
+    return order + struct.pack(f"{fmt}HI", 42, 8) + body + bytes(data)
+
+def writejpeg(path, exif):
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00' + bytes(9)
+    app1 = b'\xff\xe1' + struct.pack('>H', 2 + 6 + len(exif)) + b'Exif\x00\x00' + exif
+    path.write_bytes(b'\xff\xd8' + app0 + app1 + b'\xff\xda' + bytes(16) + b'\xff\xd9')
+    return str(path)
+
+def chunk(kind, data):
+    return struct.pack('>I4s', len(data), kind) + data + bytes(4)
+
+def writepng(path, exif):
+    ihdr = struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0)
+    path.write_bytes(b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'eXIf', exif) + chunk(b'IDAT', bytes(12)) + chunk(b'IEND', b''))
+    return str(path)
+
+EXIF = { 0x9003:"2021:06:05 14:30:15", 0x9004:"2021:06:05 14:30:16" }
+
+def test_mvhd_version0(tmp_path):
+    path = writemp4(tmp_path / 'v0.mp4', box(b'moov', mvhd(CREATED)), box(b'mdat', bytes(64)))
+    assert rename.readmvhd(path) == CREATED
+    assert rename.MP4_EPOCH + timedelta(seconds=CREATED) == datetime(2021, 3, 31, 1, 46, 40, tzinfo=timezone.utc)
+
+def test_mvhd_version1(tmp_path):
+    path = writemp4(tmp_path / 'v1.mp4', box(b'moov', mvhd(CREATED64, version=1)))
+    assert rename.readmvhd(path) == CREATED64
+
+def test_moov_after_large_mdat(tmp_path):
+    path = writemp4(tmp_path / 'late.mp4', largebox(b'mdat', bytes(4096)), box(b'free', b''), box(b'moov', box(b'udta', bytes(8)) + mvhd(CREATED)))
+    assert rename.readmvhd(path) == CREATED
+
+def test_findbox(tmp_path):
+    path = writemp4(tmp_path / 'boxes.mp4', largebox(b'mdat', bytes(32)), box(b'moov', b''))
+    with open(path, 'rb') as file:
+        size = os.path.getsize(path)
+        assert rename.findbox(file, b'mdat', 0, size) == (16 + 16, 16 + 48)
+        assert rename.findbox(file, b'moov', 0, size) == (size, size)
+        assert rename.findbox(file, b'uuid', 0, size) is None
+
+def test_box_to_end_of_file(tmp_path):
+    # size 0: the last box runs to the end of the file
+    path = tmp_path / 'open.mp4'
+    path.write_bytes(box(b'ftyp', b'isom') + struct.pack('>I4s', 0, b'moov') + mvhd(CREATED))
+    assert rename.readmvhd(str(path)) == CREATED
+
+def test_no_moov(tmp_path):
+    path = writemp4(tmp_path / 'nomoov.mp4', box(b'mdat', bytes(64)))
+    with pytest.raises(ValueError):
+        rename.readmvhd(path)
+
+def test_bad_box_size(tmp_path):
+    path = tmp_path / 'bad.mp4'
+    path.write_bytes(struct.pack('>I4s', 4, b'ftyp') + bytes(16))
+    with pytest.raises(ValueError):
+        rename.readmvhd(str(path))
+
+@pytest.mark.parametrize('order', [b'II', b'MM'])
+def test_exif_with_offset(order):
+    data = tiff(order, { 0x0132:"2020:01:01 00:00:00" }, { **EXIF, 0x9011:"+02:00" })
+    assert rename.exifdate(data) == datetime(2021, 6, 5, 14, 30, 15, tzinfo=timezone(timedelta(hours=2)))
+
+@pytest.mark.parametrize('order', [b'II', b'MM'])
+def test_exif_without_offset(order):
+    data = tiff(order, { 0x0132:"2020:01:01 00:00:00" }, EXIF)
+    assert rename.exifdate(data) == datetime(2021, 6, 5, 14, 30, 15)
+
+def test_exif_fallbacks():
+    # DateTimeDigitized without DateTimeOriginal, DateTime of IFD0 without EXIF IFD
+    assert rename.exifdate(tiff(b'II', {}, { 0x9004:"2021:06:05 14:30:16" })) == datetime(2021, 6, 5, 14, 30, 16)
+    assert rename.exifdate(tiff(b'MM', { 0x0132:"2020:01:01 10:00:00" })) == datetime(2020, 1, 1, 10, 0, 0)
+    assert rename.exifdate(tiff(b'II', { 0x0132:"    :  :     :  :  " })) is None
+    with pytest.raises(ValueError):
+        rename.exifdate(b'XX' + bytes(6))
+
+@pytest.mark.parametrize('order', [b'II', b'MM'])
+def test_readifd(order):
+    data = tiff(order, { 0x0100:4000, 0x010F:"Cam", 0x0110:"Camera Model" })
+    fmt = '<' if order == b'II' else '>'
+    tags = rename.readifd(data, struct.unpack(f"{fmt}I", data[4:8])[0], fmt)
+    assert tags == { 0x0100:4000, 0x010F:"Cam", 0x0110:"Camera Model" }
+
+def test_jpeg_exif(tmp_path):
+    data = tiff(b'MM', {}, EXIF)
+    path = writejpeg(tmp_path / 'photo.jpg', data)
+    with open(path, 'rb') as file:
+        assert rename.findjpegexif(file) == data
+    assert rename.readexif(path, 'jpg') == datetime(2021, 6, 5, 14, 30, 15)
+
+def test_jpeg_without_exif(tmp_path):
+    path = tmp_path / 'plain.jpg'
+    path.write_bytes(b'\xff\xd8' + b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00' + bytes(9) + b'\xff\xda' + bytes(16))
+    assert rename.readexif(str(path), 'jpg') is None
+
+def test_png_exif(tmp_path):
+    data = tiff(b'II', {}, { **EXIF, 0x9011:"-05:00" })
+    path = writepng(tmp_path / 'screen.png', data)
+    with open(path, 'rb') as file:
+        assert rename.findpngexif(file) == data
+    assert rename.readexif(path, 'png') == datetime(2021, 6, 5, 14, 30, 15, tzinfo=timezone(timedelta(hours=-5)))
+
+def test_png_without_exif(tmp_path):
+    path = tmp_path / 'plain.png'
+    path.write_bytes(b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', bytes(13)) + chunk(b'IEND', b''))
+    assert rename.readexif(str(path), 'png') is None
+
+# renames of a batch: planned targets, all or nothing, undo
+
+DATE = "20210605_143015"
+
+def items(dirpath, names, datestr=DATE):
+    for name in names:
+        (dirpath / name).write_bytes(name.encode())
+    return [Item(input=str(dirpath / name), datestr=datestr) for name in names]
+
+def listnames(dirpath):
+    return sorted(name for name in os.listdir(dirpath) if not name.startswith('.'))
+
+def test_plan_same_timestamp(tmp_path):
+    batch = items(tmp_path, ['a.mp4', 'b.mp4', 'a.jpg'])
+    # the same file listed twice: the second one cannot take the first target
+    batch.append(Item(input=batch[0].input, datestr=DATE))
+    rename.planrenames(batch)
+    assert [os.path.basename(item.target) for item in batch] == [f"{DATE}-a.mp4", f"{DATE}-b.mp4", f"{DATE}-a.jpg", f"{DATE}-a-1.mp4"]
+
+def test_plan_target_on_disk(tmp_path):
+    batch = items(tmp_path, ['a.mp4'])
+    (tmp_path / f"{DATE}-a.mp4").write_bytes(b'other')
+    (tmp_path / f"{DATE}-a-1.mp4").write_bytes(b'other')
+    rename.planrenames(batch)
+    assert os.path.basename(batch[0].target) == f"{DATE}-a-2.mp4"
+    rename.applyrenames(batch)
+    assert (tmp_path / f"{DATE}-a.mp4").read_bytes() == b'other'
+    assert (tmp_path / f"{DATE}-a-2.mp4").read_bytes() == b'a.mp4'
+
+def test_failed_rename_rolled_back(tmp_path, monkeypatch):
+    names = ['a.mp4', 'b.mp4', 'c.mp4', 'd.mp4']
+    batch = items(tmp_path, names)
+    rename.planrenames(batch)
+    calls = []
+    def failing(item):
+        calls.append(item)
+        if len(calls) == 3:
+            raise PermissionError(errno.EACCES, "Permission denied", item.target)
+        realrename(item)
+    realrename = rename.rename
+    monkeypatch.setattr(rename, 'rename', failing)
+    with pytest.raises(PermissionError):
+        rename.applyrenames(batch)
+    assert listnames(tmp_path) == names
+    assert all(not item.newname for item in batch)
+
+def test_target_taken_after_plan(tmp_path):
+    names = ['a.mp4', 'b.mp4', 'c.mp4']
+    batch = items(tmp_path, names)
+    rename.planrenames(batch)
+    # another process wrote the second target since: never overwritten
+    (tmp_path / f"{DATE}-b.mp4").write_bytes(b'other')
+    with pytest.raises(FileExistsError):
+        rename.applyrenames(batch)
+    assert listnames(tmp_path) == sorted(names + [f"{DATE}-b.mp4"])
+    assert (tmp_path / f"{DATE}-b.mp4").read_bytes() == b'other'
+
+def test_undo_round_trip(tmp_path):
+    names = ['a.mp4', 'b.mp4', 'c.jpg']
+    batch = items(tmp_path, names)
+    rename.planrenames(batch)
+    rename.saveundo(str(tmp_path), batch)
+    rename.applyrenames(batch)
+    assert listnames(tmp_path) == sorted(f"{DATE}-{name}" for name in names)
+    rename.undorenames(str(tmp_path))
+    assert listnames(tmp_path) == names
+    assert not (tmp_path / rename.UNDO_FILE).exists()
+    for name in names:
+        assert (tmp_path / name).read_bytes() == name.encode()
+
+def test_undo_skips_moved_files(tmp_path):
+    names = ['a.mp4', 'b.mp4']
+    batch = items(tmp_path, names)
+    rename.planrenames(batch)
+    rename.saveundo(str(tmp_path), batch)
+    rename.applyrenames(batch)
+    # moved away since, and a new file under the old name of the other one
+    os.remove(batch[0].target)
+    (tmp_path / 'b.mp4').write_bytes(b'new')
+    rename.undorenames(str(tmp_path))
+    assert listnames(tmp_path) == [f"{DATE}-b.mp4", 'b.mp4']
+    assert (tmp_path / 'b.mp4').read_bytes() == b'new'